@@ -0,0 +1,171 @@
+"""
+Control de admisión (load shedding) por clase de ruta.
+
+Cada clase (escrituras de tareas, lecturas de tareas, clima, SSE) tiene un
+límite de peticiones en curso y una cola de espera acotada. Cuando la cola
+está llena, o la espera supera ADMISSION_QUEUE_TIMEOUT_MS, se responde 503
+con Retry-After en lugar de aceptar trabajo que solo alargaría la latencia
+de todos. Las rutas sin clase (health check en '/', frontend, docs) siempre
+se admiten.
+
+Los límites de tareas deben sumar menos que el pool de conexiones de SQLAlchemy
+(5 + 10 de overflow): las llamadas síncronas a la base bloquean el event loop
+y, si el pool se agota, las peticiones esperan una conexión hasta el timeout.
+"""
+import asyncio
+from typing import Any, Dict, Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+from config import settings
+
+# Métodos que modifican datos
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+class AdmissionClass:
+    """
+    Límite de concurrencia con cola de espera acotada para una clase de rutas
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    async def acquire(self, timeout: float) -> bool:
+        """Ocupa un lugar; False si la cola está llena o la espera expira"""
+        if self.semaphore.locked():
+            if self.waiting >= self.queue_size:
+                self.stats["rejected"] += 1
+                return False
+            self.stats["queued"] += 1
+            self.waiting += 1
+            try:
+                acquired = await self._acquire_within(timeout)
+            finally:
+                self.waiting -= 1
+            if not acquired:
+                self.stats["timed_out"] += 1
+                return False
+        else:
+            await self.semaphore.acquire()
+        self.active += 1
+        self.stats["admitted"] += 1
+        return True
+
+    async def _acquire_within(self, timeout: float) -> bool:
+        """
+        Espera un lugar hasta 'timeout' sin perder permisos: con asyncio.wait_for
+        (Python 3.10) una adquisición completada justo al expirar se descarta y su
+        permiso nunca se libera
+        """
+        waiter = asyncio.ensure_future(self.semaphore.acquire())
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        except BaseException:
+            # Petición cancelada mientras esperaba
+            self._abandon(waiter)
+            raise
+        if waiter.done():
+            return True
+        self._abandon(waiter)
+        return False
+
+    def _abandon(self, waiter: asyncio.Future):
+        """Cancela una espera; si la adquisición terminó igual, devuelve el permiso"""
+        waiter.cancel()
+        waiter.add_done_callback(
+            lambda future: self.semaphore.release() if not future.cancelled() else None
+        )
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": self.active,
+            "waiting": self.waiting,
+            "limit": self.limit,
+            "queue_size": self.queue_size
+        }
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Clase de admisión de una petición (None: se admite siempre)"""
+    if path.startswith("/api/logs"):
+        return "sse"
+    if path.startswith("/api/weather"):
+        return "weather"
+    if path.startswith(("/api/tasks", "/api/lists")):
+        return "task_writes" if method in WRITE_METHODS else "task_reads"
+    if path.startswith("/api/stats"):
+        return "task_reads"
+    return None
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI: la petición ocupa su lugar hasta terminar de enviar la
+    respuesta (incluidos streams como SSE o exportaciones)
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = settings.ADMISSION_ENABLED
+        self.queue_timeout = settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000
+        self.classes = {
+            "task_writes": AdmissionClass(
+                "task_writes", settings.ADMISSION_TASK_WRITES_LIMIT, settings.ADMISSION_TASK_WRITES_QUEUE
+            ),
+            "task_reads": AdmissionClass(
+                "task_reads", settings.ADMISSION_TASK_READS_LIMIT, settings.ADMISSION_TASK_READS_QUEUE
+            ),
+            "weather": AdmissionClass(
+                "weather", settings.ADMISSION_WEATHER_LIMIT, settings.ADMISSION_WEATHER_QUEUE
+            ),
+            "sse": AdmissionClass("sse", settings.ADMISSION_SSE_LIMIT, settings.ADMISSION_SSE_QUEUE),
+        }
+        admission_controller.middleware = self
+
+    async def __call__(self, scope, receive, send):
+        name = classify(scope["method"], scope["path"]) if scope["type"] == "http" and self.enabled else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        admission = self.classes[name]
+        if not await admission.acquire(self.queue_timeout):
+            response = JSONResponse(
+                {"detail": "Servicio sobrecargado, reintente más tarde", "clase": name},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
+
+class AdmissionController:
+    """Acceso al middleware instalado para reportar sus estadísticas"""
+
+    def __init__(self):
+        self.middleware: Optional[AdmissionMiddleware] = None
+
+    def report(self) -> Dict[str, Any]:
+        if self.middleware is None:
+            return {"enabled": False, "classes": {}}
+        return {
+            "enabled": self.middleware.enabled,
+            "queue_timeout_ms": settings.ADMISSION_QUEUE_TIMEOUT_MS,
+            "classes": {name: admission.report() for name, admission in self.middleware.classes.items()}
+        }
+
+# Instancia global (el middleware se registra al construirse la pila de la aplicación)
+admission_controller = AdmissionController()
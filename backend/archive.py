@@ -0,0 +1,97 @@
+"""
+Archivado automático de tareas completadas antiguas (separación datos calientes/fríos)
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import select, insert, delete, and_, or_, literal
+from starlette.concurrency import run_in_threadpool
+
+from models import Task, ArchivedTask, TaskTombstone, engine
+from task_cache import task_cache
+from config import settings
+
+# Columnas que se copian de la tabla principal al archivo
+ARCHIVE_COLUMNS = [col.name for col in ArchivedTask.__table__.c if col.name in Task.__table__.c]
+
+def _archivable_filter(cutoff: datetime):
+    """
+    Condición de tareas completadas sin cambios desde antes de la fecha límite.
+    Excluye IDs que ya están en el archivo: en bases creadas antes de AUTOINCREMENT
+    la tabla tasks puede reutilizar el ID de una tarea archivada, y archivarla
+    sobrescribiría a la anterior.
+    """
+    return and_(
+        Task.estado == "completada",
+        or_(
+            Task.fecha_actualizacion < cutoff,
+            and_(Task.fecha_actualizacion.is_(None), Task.fecha_creacion < cutoff)
+        ),
+        ~select(ArchivedTask.id).where(ArchivedTask.id == Task.id).exists()
+    )
+
+def archive_batch(cutoff: datetime, batch_size: int) -> int:
+    """
+    Mueve un lote de tareas al archivo en una transacción corta.
+    Devuelve el número de tareas archivadas.
+    """
+    with engine.begin() as conn:
+        ids: List[int] = conn.execute(
+            select(Task.id).where(_archivable_filter(cutoff)).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return 0
+
+        source_columns = [Task.__table__.c[name] for name in ARCHIVE_COLUMNS]
+        conn.execute(
+            insert(ArchivedTask).from_select(
+                ARCHIVE_COLUMNS,
+                select(*source_columns).where(Task.id.in_(ids))
+            )
+        )
+        # Para la sincronización delta una tarea archivada sale de la lista activa
+        conn.execute(
+            insert(TaskTombstone).prefix_with("OR REPLACE").from_select(
+                ["task_id", "archivada"],
+                select(Task.id, literal(True)).where(Task.id.in_(ids))
+            )
+        )
+        conn.execute(delete(Task).where(Task.id.in_(ids)))
+    return len(ids)
+
+async def archive_old_tasks(max_age_days: int = None, batch_size: int = None) -> int:
+    """
+    Archiva todas las tareas elegibles en lotes pequeños, cediendo el lock
+    de escritura entre lotes para no bloquear a otros escritores
+    """
+    max_age_days = max_age_days if max_age_days is not None else settings.ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+
+    total = 0
+    while True:
+        archived = await run_in_threadpool(archive_batch, cutoff, batch_size)
+        total += archived
+        if archived < batch_size:
+            break
+        # Pausa breve entre lotes para dejar pasar otras escrituras
+        await asyncio.sleep(0.05)
+
+    if total:
+        task_cache.clear()
+        print(f"[Archive] {total} tareas completadas archivadas")
+    return total
+
+async def archive_loop():
+    """
+    Tarea en segundo plano que ejecuta el archivado periódicamente
+    """
+    while True:
+        try:
+            await archive_old_tasks()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Archive] Error archivando tareas: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
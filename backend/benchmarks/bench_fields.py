@@ -0,0 +1,84 @@
+"""
+Benchmark de proyección de campos: respuesta completa vs ?fields=id,titulo,estado.
+
+Carga tareas con descripciones largas y mide, para el listado paginado y la
+exportación, el tiempo por petición, los bytes de respuesta y el pico de
+memoria asignada en Python (tracemalloc) por petición, que incluye el cuerpo
+recibido por el cliente de prueba.
+
+Uso (desde backend/):
+    python benchmarks/bench_fields.py [--tasks 20000] [--description-size 2000]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Base de datos temporal y arranque mínimo antes de importar la aplicación
+_tmp_dir = tempfile.mkdtemp(prefix="tasktracker-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.setdefault("FAST_START", "true")
+# Sin caché de listados: se mide la consulta y la serialización
+os.environ["TASK_CACHE_MAX_ITEMS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from main import app
+from models import create_tables, engine, Task
+
+FIELDS = "id,titulo,estado"
+
+CASES = [
+    ("listado 1000", "/api/tasks", {"limit": 1000}),
+    ("exportación", "/api/tasks/export", {}),
+]
+
+def seed(tasks: int, description_size: int):
+    """Inserta tareas con descripciones largas en una sola transacción"""
+    description = "x" * description_size
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), [
+            {"titulo": f"tarea {i}", "descripcion": description, "estado": "pendiente" if i % 3 else "completada"}
+            for i in range(tasks)
+        ])
+
+async def measure(client: httpx.AsyncClient, url: str, params: dict, repeats: int):
+    """Devuelve (ms p50, bytes, pico de memoria en KB) de una petición"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = await client.get(url, params=params)
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+
+    tracemalloc.start()
+    response = await client.get(url, params=params)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), len(response.content), peak / 1024
+
+async def main(tasks: int, description_size: int, repeats: int):
+    create_tables()
+    seed(tasks, description_size)
+    print(f"{tasks} tareas, descripciones de {description_size} bytes")
+    print(f"{'consulta':<14} {'campos':<18} {'p50 ms':>9} {'KB resp':>10} {'pico KB':>10}")
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for name, url, params in CASES:
+            for fields in (None, FIELDS):
+                case_params = dict(params, fields=fields) if fields else params
+                p50, size, peak = await measure(client, url, case_params, repeats)
+                print(f"{name:<14} {fields or 'todos':<18} {p50:>9.1f} {size / 1024:>10.0f} {peak:>10.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=20000, help="tareas a insertar")
+    parser.add_argument("--description-size", type=int, default=2000, help="bytes de cada descripción")
+    parser.add_argument("--repeats", type=int, default=5, help="repeticiones por caso")
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.description_size, args.repeats))
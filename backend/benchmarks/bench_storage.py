@@ -0,0 +1,138 @@
+"""
+Benchmark de motores de almacenamiento: SQLite vs journal append-only en memoria.
+
+Para cada motor ejecuta, con escritores concurrentes, creaciones (POST),
+actualizaciones (PATCH con If-Match), lecturas por ID (GET) y listados paginados,
+y mide operaciones por segundo y latencia (p50/p99). Al final mide la
+recuperación del journal al reiniciar.
+
+El motor se elige al importar la aplicación, así que cada configuración
+se ejecuta en un subproceso con su propio directorio temporal.
+
+Uso (desde backend/):
+    python benchmarks/bench_storage.py [--ops 2000] [--concurrency 8]
+
+Con SQLite y ADMISSION_ENABLED=false la concurrencia debe quedar por debajo
+del pool de conexiones (15); con el control de admisión el exceso espera en cola.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (nombre, variables de entorno)
+CONFIGURATIONS = [
+    ("sqlite", {"STORAGE_BACKEND": "sqlite"}),
+    ("journal", {"STORAGE_BACKEND": "journal", "JOURNAL_FSYNC_INTERVAL_MS": "0"}),
+    ("journal-10ms", {"STORAGE_BACKEND": "journal", "JOURNAL_FSYNC_INTERVAL_MS": "10"}),
+]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run_phase(client, name: str, ops: int, concurrency: int, request):
+    """Ejecuta 'ops' peticiones repartidas entre 'concurrency' workers"""
+    latencies = []
+    per_worker = max(1, ops // concurrency)
+
+    async def worker(worker_id: int):
+        for i in range(per_worker):
+            started = time.perf_counter()
+            response = await request(worker_id * per_worker + i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "phase": name,
+        "ops_s": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99)
+    }
+
+async def child_main(ops: int, concurrency: int):
+    """Ejecuta las fases contra la aplicación en este proceso e imprime JSON"""
+    import httpx
+    from main import app, startup_event, shutdown_event
+
+    await startup_event()
+    results = []
+    ids = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def create(i):
+            response = await client.post("/api/tasks", json={"titulo": f"bench {i}", "descripcion": "x" * 40})
+            ids.append(response.json()["id"])
+            return response
+        results.append(await run_phase(client, "POST", ops, concurrency, create))
+
+        async def patch(i):
+            task_id = ids[i % len(ids)]
+            return await client.patch(
+                f"/api/tasks/{task_id}",
+                json={"estado": "completada" if i % 2 else "pendiente"}
+            )
+        results.append(await run_phase(client, "PATCH", ops, concurrency, patch))
+
+        async def get(i):
+            return await client.get(f"/api/tasks/{ids[i % len(ids)]}")
+        results.append(await run_phase(client, "GET", ops, concurrency, get))
+
+        async def page(i):
+            return await client.get("/api/tasks", params={"limit": 50, "estado": "completada"})
+        results.append(await run_phase(client, "LIST", max(1, ops // 10), concurrency, page))
+    await shutdown_event()
+
+    from journal_store import task_store
+    if task_store is not None:
+        started = time.perf_counter()
+        task_store.open()
+        results.append({"phase": "recovery", "ms": (time.perf_counter() - started) * 1000, "tasks": len(task_store.tasks)})
+        task_store.close()
+    print(json.dumps(results))
+
+def main(ops: int, concurrency: int):
+    print(f"{'motor':<14} {'fase':<9} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, env in CONFIGURATIONS:
+        tmp_dir = tempfile.mkdtemp(prefix="tasktracker-bench-")
+        child_env = {
+            **os.environ,
+            **env,
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+            "JOURNAL_DIR": tmp_dir,
+            "FAST_START": "true",
+            "ARCHIVE_ENABLED": "false",
+            "TASK_CACHE_MAX_ITEMS": "0"
+        }
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--ops", str(ops), "--concurrency", str(concurrency)],
+            cwd=BACKEND_DIR, env=child_env, capture_output=True, text=True, check=True
+        ).stdout
+        for result in json.loads(output.strip().splitlines()[-1]):
+            if result["phase"] == "recovery":
+                print(f"{name:<14} {'recovery':<9} {result['tasks']:>9} tareas en {result['ms']:.1f} ms")
+            else:
+                print(
+                    f"{name:<14} {result['phase']:<9} {result['ops_s']:>9.0f} "
+                    f"{result['p50']:>9.2f} {result['p99']:>9.2f}"
+                )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ops", type=int, default=2000, help="operaciones por fase")
+    parser.add_argument("--concurrency", type=int, default=8, help="workers concurrentes")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        sys.path.insert(0, BACKEND_DIR)
+        asyncio.run(child_main(args.ops, args.concurrency))
+    else:
+        main(args.ops, args.concurrency)
@@ -0,0 +1,155 @@
+"""
+Benchmark de /api/weather contra el simulador local de proveedores.
+
+Levanta benchmarks/weather_simulator.py en un subproceso, apunta las URLs de
+los proveedores a él y, para cada perfil de fallas (nominal, lento, errores,
+timeouts, caído), ejecuta consultas concurrentes por ciudad y por coordenadas
+con la cache vacía. Mide la latencia (p50/p99/máx), la fracción de respuestas
+de prueba (todos los proveedores fallaron) y las llamadas a cada proveedor
+por consulta.
+
+Uso (desde backend/):
+    python benchmarks/bench_weather.py [--requests 400] [--locations 20] [--concurrency 16]
+
+Con --providers wttr solo se usa la API gratuita (sin API keys).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULATOR = os.path.join(BACKEND_DIR, "benchmarks", "weather_simulator.py")
+PROVIDERS = ["weatherapi", "openweather", "wttr", "bigdatacloud"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_simulator(port: int) -> subprocess.Popen:
+    """Inicia el simulador y espera a que responda"""
+    import httpx
+
+    process = subprocess.Popen([sys.executable, SIMULATOR, "--port", str(port)], cwd=BACKEND_DIR)
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/__stats", timeout=0.5)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("El simulador de clima no arrancó")
+
+def configure(base_url: str, providers: str, timeout: float):
+    """Variables de entorno de la API (antes de importarla)"""
+    os.environ.update({
+        "WEATHERAPI_BASE_URL": base_url,
+        "OPENWEATHER_BASE_URL": base_url,
+        "WTTR_BASE_URL": base_url,
+        "BIGDATACLOUD_BASE_URL": base_url,
+        "WEATHER_UPSTREAM_TIMEOUT_SECONDS": str(timeout),
+        "WEATHER_PREFETCH_ENABLED": "false",
+        "FAST_START": "true",
+        "DATABASE_URL": "sqlite:///:memory:"
+    })
+    for name in ("WEATHERAPI_KEY", "OPENWEATHER_API_KEY", "ACCUWEATHER_API_KEY"):
+        os.environ.pop(name, None)
+    if providers == "keys":
+        os.environ["WEATHERAPI_KEY"] = "simulador"
+        os.environ["OPENWEATHER_API_KEY"] = "simulador"
+
+async def run_profile(client, control, profile: str, requests: int, locations: int, concurrency: int):
+    """Ejecuta las consultas de un perfil con la cache vacía"""
+    import weather
+
+    await control.post("/__profile", json={"name": profile})
+    weather.weather_service.cache.clear()
+    weather.weather_service.popularity.clear()
+
+    # Mitad por ciudad y mitad por coordenadas, repartidas entre 'locations' ubicaciones
+    queries = [
+        {"city": f"Ciudad{i % locations}"} if i % 2 == 0 else {"lat": -12.0 - i % locations, "lon": -77.0}
+        for i in range(requests)
+    ]
+    latencies, demo = [], 0
+    pending = iter(queries)
+
+    async def worker():
+        nonlocal demo
+        for params in pending:
+            started = time.perf_counter()
+            response = await client.get("/api/weather", params=params)
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            demo += bool(response.json().get("demo"))
+
+    started = time.perf_counter()
+    # Silenciar los logs [Weather] del servicio durante la medición
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    calls = (await control.get("/__stats")).json()["providers"]
+    return {
+        "ops_s": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "demo": demo / len(latencies),
+        "calls": {name: calls.get(name, {}).get("calls", 0) for name in PROVIDERS}
+    }
+
+async def main(args):
+    import httpx
+
+    from main import app
+    from weather_simulator import PROFILES
+
+    print(
+        f"{args.requests} consultas, {args.locations} ubicaciones, concurrencia {args.concurrency}, "
+        f"proveedores: {args.providers}, timeout {args.timeout} s"
+    )
+    header = f"{'perfil':<10} {'ops/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'máx ms':>8} {'demo':>6}"
+    print(header + "".join(f" {name:>12}" for name in PROVIDERS) + f" {'llamadas/op':>12}")
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client, \
+            httpx.AsyncClient(base_url=args.simulator_url) as control:
+        for profile in args.profiles or list(PROFILES):
+            result = await run_profile(client, control, profile, args.requests, args.locations, args.concurrency)
+            total_calls = sum(result["calls"].values())
+            print(
+                f"{profile:<10} {result['ops_s']:>7.0f} {result['p50']:>8.1f} {result['p99']:>8.1f} "
+                f"{result['max']:>8.1f} {result['demo']:>6.0%}"
+                + "".join(f" {result['calls'][name]:>12}" for name in PROVIDERS)
+                + f" {total_calls / args.requests:>12.2f}"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400, help="consultas por perfil")
+    parser.add_argument("--locations", type=int, default=20, help="ubicaciones distintas")
+    parser.add_argument("--concurrency", type=int, default=16, help="clientes concurrentes")
+    parser.add_argument("--providers", choices=["keys", "wttr"], default="keys",
+                        help="keys: WeatherAPI y OpenWeatherMap con wttr.in de respaldo; wttr: solo la API gratuita")
+    parser.add_argument("--timeout", type=float, default=1.0, help="timeout de cada llamada a proveedor (s)")
+    parser.add_argument("--profile", dest="profiles", action="append", help="perfil a ejecutar (repetible)")
+    args = parser.parse_args()
+
+    port = free_port()
+    args.simulator_url = f"http://127.0.0.1:{port}"
+    configure(args.simulator_url, args.providers, args.timeout)
+    sys.path.insert(0, BACKEND_DIR)
+    simulator = start_simulator(port)
+    try:
+        asyncio.run(main(args))
+    finally:
+        simulator.terminate()
+        simulator.wait()
@@ -0,0 +1,89 @@
+"""
+Microbenchmark del camino de respuesta de /api/weather con la cache caliente.
+
+Compara, por llamada, el camino anterior con el actual:
+- acierto de cache: dict + jsonable_encoder + JSONResponse vs bytes precodificados
+- iconos: reconstruir la tabla de 50 entradas por llamada vs tabla del módulo
+- zona horaria: pytz.timezone() por llamada vs resolución cacheada
+
+Uso (desde backend/):
+    python benchmarks/bench_weather_payload.py [--iterations 50000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("WEATHER_PREFETCH_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+import weather
+
+SAMPLE = {
+    "ciudad": "Lima, Peru",
+    "temperatura": 22,
+    "descripcion": "Parcialmente nublado",
+    "icono": "⛅",
+    "humedad": 65,
+    "sensacion_termica": 24,
+    "ultima_actualizacion": "12:00",
+    "timestamp": "2024-01-01T12:00:00",
+    "success": True,
+    "source": "WeatherAPI"
+}
+
+async def per_call_us(function, iterations: int) -> float:
+    """Microsegundos por llamada de una corrutina sin argumentos"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await function()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+async def main(iterations: int):
+    service = weather.weather_service
+    service._cache_and_return(service._city_cache_key("Lima"), dict(SAMPLE))
+
+    async def hit_before():
+        # Camino anterior: el endpoint devolvía el dict y FastAPI lo serializaba en cada acierto
+        return JSONResponse(jsonable_encoder(await service.get_weather("Lima"))).body
+
+    async def hit_after():
+        return Response(await service.get_weather_body("Lima"), media_type="application/json").body
+
+    assert await hit_before() == await hit_after(), "las respuestas deben ser idénticas"
+
+    async def icon_before():
+        # Equivale a construir el literal de 50 entradas en cada llamada
+        return dict(weather.WTTR_ICONS).get("116", weather.DEFAULT_ICON)
+
+    async def icon_after():
+        return service._wttr_icon_to_emoji("116")
+
+    cases = [
+        ("acierto de cache", hit_before, hit_after),
+        ("icono wttr.in", icon_before, icon_after),
+    ]
+    if weather.pytz is not None:
+        async def tz_before():
+            return weather.pytz.timezone("America/Lima")
+
+        async def tz_after():
+            return weather.resolve_timezone("America/Lima")
+
+        cases.append(("zona horaria", tz_before, tz_after))
+
+    print(f"{'caso':<18} {'antes µs':>10} {'ahora µs':>10} {'mejora':>8}")
+    for name, before, after in cases:
+        before_us = await per_call_us(before, iterations)
+        after_us = await per_call_us(after, iterations)
+        print(f"{name:<18} {before_us:>10.2f} {after_us:>10.2f} {before_us / after_us:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=50000, help="llamadas por caso")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
@@ -0,0 +1,81 @@
+"""
+Benchmark de escrituras: commit individual vs cola con commit agrupado.
+
+Mide escrituras por segundo y latencia (p50/p99) con 1, 16 y 256 escritores
+concurrentes haciendo POST /api/tasks contra una base de datos temporal.
+
+El control de admisión se desactiva (ADMISSION_ENABLED=false): sus límites por
+defecto (6 escrituras en curso, 100 en espera) responderían 503 con 256
+escritores y recortarían los lotes agrupados, midiendo el límite en lugar de
+la cola.
+
+Uso (desde backend/):
+    python benchmarks/bench_write_queue.py [--writes 2048]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Base de datos temporal y arranque mínimo antes de importar la aplicación
+_tmp_dir = tempfile.mkdtemp(prefix="tasktracker-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.setdefault("FAST_START", "true")
+os.environ["ADMISSION_ENABLED"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from main import app
+from models import create_tables
+from write_queue import write_queue
+
+CONCURRENCY_LEVELS = [1, 16, 256]
+
+async def run_writers(client: httpx.AsyncClient, writers: int, total_writes: int):
+    """Lanza N escritores concurrentes y devuelve (segundos, latencias en ms)"""
+    per_writer = max(1, total_writes // writers)
+    latencies = []
+
+    async def writer(worker_id: int):
+        for i in range(per_writer):
+            started = time.perf_counter()
+            response = await client.post("/api/tasks", json={"titulo": f"bench {worker_id}-{i}"})
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(writers)))
+    return time.perf_counter() - started, latencies
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def main(total_writes: int):
+    create_tables()
+    print(f"{'modo':<10} {'escritores':>10} {'writes/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for grouped in (False, True):
+            if grouped:
+                write_queue.start()
+            for writers in CONCURRENCY_LEVELS:
+                elapsed, latencies = await run_writers(client, writers, total_writes)
+                print(
+                    f"{'agrupado' if grouped else 'directo':<10} {writers:>10} "
+                    f"{len(latencies) / elapsed:>10.0f} "
+                    f"{statistics.median(latencies):>9.2f} {percentile(latencies, 99):>9.2f}"
+                )
+            if grouped:
+                await write_queue.stop()
+                print(f"lotes: {write_queue.stats}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writes", type=int, default=2048, help="escrituras totales por nivel de concurrencia")
+    args = parser.parse_args()
+    asyncio.run(main(args.writes))
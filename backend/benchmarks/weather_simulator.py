@@ -0,0 +1,159 @@
+"""
+Simulador local de proveedores de clima para medir sin acceso a red.
+
+Imita la forma JSON de WeatherAPI (/v1/current.json), OpenWeatherMap
+(/data/2.5/weather), wttr.in (/{ciudad}?format=j1) y bigdatacloud
+(/data/reverse-geocode-client), e inyecta latencia, errores y timeouts según
+un perfil de fallas que se puede cambiar en caliente.
+
+Uso (desde backend/):
+    python benchmarks/weather_simulator.py [--port 8099] [--profile lento]
+
+y apuntar la API al simulador con WEATHERAPI_BASE_URL, OPENWEATHER_BASE_URL,
+WTTR_BASE_URL y BIGDATACLOUD_BASE_URL=http://127.0.0.1:8099.
+
+Control: GET /__stats (llamadas por proveedor y resultado) y
+POST /__profile (nombre de perfil o campos de FaultProfile; reinicia contadores).
+"""
+import argparse
+import asyncio
+import random
+import zlib
+from typing import Dict, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+class FaultProfile(BaseModel):
+    distribution: str = "fixed"  # fixed | uniform | lognormal
+    latency_ms: float = 20       # valor fijo, centro (uniform) o mediana (lognormal)
+    jitter_ms: float = 0         # uniform: ± jitter_ms
+    sigma: float = 0.5           # lognormal: dispersión
+    error_rate: float = 0.0      # fracción de respuestas con error_status
+    error_status: int = 500
+    timeout_rate: float = 0.0    # fracción de respuestas retenidas hang_ms (más que el timeout del cliente)
+    hang_ms: float = 5000
+
+    def sample_latency(self) -> float:
+        """Latencia de una respuesta en segundos"""
+        if self.distribution == "uniform":
+            latency = random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        elif self.distribution == "lognormal":
+            latency = random.lognormvariate(0, self.sigma) * self.latency_ms
+        else:
+            latency = self.latency_ms
+        return max(0.0, latency) / 1000
+
+# Perfiles de fallas predefinidos
+PROFILES: Dict[str, FaultProfile] = {
+    "nominal": FaultProfile(distribution="uniform", latency_ms=30, jitter_ms=10),
+    "lento": FaultProfile(distribution="lognormal", latency_ms=400, sigma=0.8),
+    "errores": FaultProfile(distribution="uniform", latency_ms=30, jitter_ms=10, error_rate=0.3),
+    "timeouts": FaultProfile(distribution="uniform", latency_ms=30, jitter_ms=10, timeout_rate=0.2),
+    "caido": FaultProfile(latency_ms=5, error_rate=1.0, error_status=503),
+}
+
+class ProfileChange(FaultProfile):
+    name: Optional[str] = None  # perfil predefinido; si se indica, ignora los demás campos
+
+app = FastAPI(title="Weather simulator")
+state = {"profile": PROFILES["nominal"], "stats": {}}
+
+def _count(provider: str, outcome: str):
+    counters = state["stats"].setdefault(provider, {"calls": 0, "ok": 0, "error": 0, "timeout": 0})
+    counters["calls"] += 1
+    counters[outcome] += 1
+
+async def _respond(provider: str, payload: dict):
+    """Aplica el perfil de fallas: retiene, falla o responde tras la latencia"""
+    profile = state["profile"]
+    roll = random.random()
+    if roll < profile.timeout_rate:
+        _count(provider, "timeout")
+        await asyncio.sleep(profile.hang_ms / 1000)
+        return JSONResponse({"error": "timeout simulado"}, status_code=504)
+    await asyncio.sleep(profile.sample_latency())
+    if roll < profile.timeout_rate + profile.error_rate:
+        _count(provider, "error")
+        return JSONResponse({"error": "falla simulada"}, status_code=profile.error_status)
+    _count(provider, "ok")
+    return payload
+
+def _conditions(place: str) -> dict:
+    """Valores estables por ubicación (el mismo lugar siempre da el mismo clima)"""
+    seed = zlib.crc32(place.lower().encode())
+    return {"temp": 5 + seed % 25, "feels": 4 + seed % 27, "humidity": 30 + seed % 60}
+
+@app.get("/v1/current.json")
+async def weatherapi(q: str, key: str = "", lang: str = "es"):
+    weather = _conditions(q)
+    return await _respond("weatherapi", {
+        "location": {"name": q.title(), "country": "Simulado", "tz_id": "America/Lima"},
+        "current": {
+            "temp_c": weather["temp"] + 0.4,
+            "feelslike_c": weather["feels"] + 0.2,
+            "humidity": weather["humidity"],
+            "condition": {"text": "Parcialmente nublado", "code": 1003}
+        }
+    })
+
+@app.get("/data/2.5/weather")
+async def openweather(q: Optional[str] = None, lat: Optional[float] = None, lon: Optional[float] = None):
+    place = q or f"{lat},{lon}"
+    weather = _conditions(place)
+    return await _respond("openweather", {
+        "name": place.title(),
+        "timezone": -18000,
+        "sys": {"country": "SM"},
+        "main": {"temp": weather["temp"] + 0.4, "feels_like": weather["feels"] + 0.2, "humidity": weather["humidity"]},
+        "weather": [{"description": "nubes dispersas", "icon": "03d"}]
+    })
+
+@app.get("/data/reverse-geocode-client")
+async def bigdatacloud(latitude: float, longitude: float):
+    return await _respond("bigdatacloud", {
+        "city": f"Ciudad {round(latitude)} {round(longitude)}",
+        "locality": "Simulada",
+        "principalSubdivision": "Simulada"
+    })
+
+@app.get("/__stats")
+async def stats():
+    return {"profile": state["profile"].model_dump(), "providers": state["stats"]}
+
+@app.post("/__profile")
+async def change_profile(change: ProfileChange):
+    if change.name is not None:
+        if change.name not in PROFILES:
+            return JSONResponse({"error": f"Perfiles: {', '.join(PROFILES)}"}, status_code=400)
+        state["profile"] = PROFILES[change.name]
+    else:
+        state["profile"] = FaultProfile(**change.model_dump(exclude={"name"}))
+    state["stats"] = {}
+    return state["profile"].model_dump()
+
+# Debe ir al final: captura cualquier otra ruta como ciudad de wttr.in
+@app.get("/{city}")
+async def wttr(city: str, format: str = "j1"):
+    weather = _conditions(city)
+    return await _respond("wttr", {
+        "current_condition": [{
+            "temp_C": str(weather["temp"]),
+            "FeelsLikeC": str(weather["feels"]),
+            "humidity": str(weather["humidity"]),
+            "weatherCode": "116",
+            "weatherDesc": [{"value": "Partly cloudy"}]
+        }]
+    })
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--profile", choices=list(PROFILES), default="nominal", help="perfil de fallas inicial")
+    args = parser.parse_args()
+    state["profile"] = PROFILES[args.profile]
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -15,6 +15,15 @@ class Settings:
     WEATHERAPI_KEY: Optional[str] = os.getenv("WEATHERAPI_KEY")
     OPENWEATHER_API_KEY: Optional[str] = os.getenv("OPENWEATHER_API_KEY")
     ACCUWEATHER_API_KEY: Optional[str] = os.getenv("ACCUWEATHER_API_KEY")
+    # URLs base de los proveedores (p. ej. el simulador local de benchmarks/weather_simulator.py)
+    WEATHERAPI_BASE_URL: str = os.getenv("WEATHERAPI_BASE_URL", "https://api.weatherapi.com").rstrip("/")
+    OPENWEATHER_BASE_URL: str = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org").rstrip("/")
+    WTTR_BASE_URL: str = os.getenv("WTTR_BASE_URL", "https://wttr.in").rstrip("/")
+    BIGDATACLOUD_BASE_URL: str = os.getenv("BIGDATACLOUD_BASE_URL", "https://api.bigdatacloud.net").rstrip("/")
+    # Timeout único para todos los proveedores (sin definir: 10 s, 15 s para wttr.in y 5 s para geocoding)
+    WEATHER_UPSTREAM_TIMEOUT_SECONDS: Optional[float] = (
+        float(os.environ["WEATHER_UPSTREAM_TIMEOUT_SECONDS"]) if os.getenv("WEATHER_UPSTREAM_TIMEOUT_SECONDS") else None
+    )
     
     # CORS settings
     ALLOWED_ORIGINS: list = [
@@ -28,7 +37,81 @@ class Settings:
     APP_VERSION: str = "1.0.0"
     APP_DESCRIPTION: str = "Sistema completo de gestión de tareas con API REST y widget de clima"
     
+    # Arranque rápido (cold start): difiere el clima y omite datos de ejemplo
+    FAST_START: bool = os.getenv("FAST_START", "false").lower() == "true"
+    SEED_SAMPLE_TASKS: bool = os.getenv("SEED_SAMPLE_TASKS", "false" if FAST_START else "true").lower() == "true"
+    
+    # Archivado de tareas completadas antiguas
+    ARCHIVE_ENABLED: bool = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+    ARCHIVE_BATCH_SIZE: int = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))  # filas por transacción
+    ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+    
+    # Cola de escrituras con commit agrupado (opcional)
+    WRITE_QUEUE_ENABLED: bool = os.getenv("WRITE_QUEUE_ENABLED", "false").lower() == "true"
+    WRITE_QUEUE_MAX_BATCH: int = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "256"))  # mutaciones por transacción
+    WRITE_QUEUE_WINDOW_MS: float = float(os.getenv("WRITE_QUEUE_WINDOW_MS", "2"))  # ventana de agrupación
+    
+    # Caché en memoria de tareas (0 = desactivada)
+    TASK_CACHE_MAX_ITEMS: int = int(os.getenv("TASK_CACHE_MAX_ITEMS", "10000"))
+    TASK_CACHE_MAX_LIST_ROWS: int = int(os.getenv("TASK_CACHE_MAX_LIST_ROWS", "1000"))  # listados más grandes no se cachean
+    TASK_CACHE_MAX_LISTS: int = 8
+    # Verificar PRAGMA data_version para detectar escrituras de otros workers
+    TASK_CACHE_VERIFY_DATA_VERSION: bool = os.getenv("TASK_CACHE_VERIFY_DATA_VERSION", "true").lower() == "true"
+    
+    # Motor de almacenamiento de tareas: sqlite (por defecto) | journal (memoria + journal append-only)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+    JOURNAL_DIR: str = os.getenv("JOURNAL_DIR", os.path.join(os.path.dirname(__file__), "..", "db"))
+    JOURNAL_FSYNC_INTERVAL_MS: int = int(os.getenv("JOURNAL_FSYNC_INTERVAL_MS", "0"))  # 0 = fsync en cada escritura
+    JOURNAL_COMPACT_EVERY: int = int(os.getenv("JOURNAL_COMPACT_EVERY", "50000"))  # entradas antes de compactar
+    
+    # Listas de tareas: una base SQLite por shard (cada lista se asigna a un shard al crearla)
+    TASK_SHARDS: int = int(os.getenv("TASK_SHARDS", "4"))
+    TASK_SHARDS_DIR: str = os.getenv("TASK_SHARDS_DIR", os.path.join(os.path.dirname(__file__), "..", "db", "shards"))
+    
+    # Historial de estadísticas
+    STATS_HISTORY_MAX_DAYS: int = int(os.getenv("STATS_HISTORY_MAX_DAYS", "3660"))  # días como máximo por consulta a /api/stats/history
+    
+    # Orden manual: claves de rango fraccionarias con rebalanceo periódico
+    RANK_MAX_LENGTH: int = int(os.getenv("RANK_MAX_LENGTH", "32"))  # caracteres antes de rebalancear
+    RANK_REBALANCE_INTERVAL_SECONDS: int = int(os.getenv("RANK_REBALANCE_INTERVAL_SECONDS", "3600"))
+    RANK_REBALANCE_BATCH_SIZE: int = int(os.getenv("RANK_REBALANCE_BATCH_SIZE", "500"))  # filas por transacción
+    
+    # Control de admisión: peticiones en curso y cola de espera por clase de ruta (503 + Retry-After al llenarse).
+    # Los límites de tareas suman menos que el pool de conexiones (5 + 10 de overflow); con la cola de
+    # escrituras activa, las escrituras no ocupan conexiones del pool y su límite es el tamaño de un lote
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_TASK_WRITES_LIMIT: int = int(
+        os.getenv("ADMISSION_TASK_WRITES_LIMIT", str(WRITE_QUEUE_MAX_BATCH) if WRITE_QUEUE_ENABLED else "6")
+    )
+    ADMISSION_TASK_WRITES_QUEUE: int = int(os.getenv("ADMISSION_TASK_WRITES_QUEUE", "100"))
+    ADMISSION_TASK_READS_LIMIT: int = int(os.getenv("ADMISSION_TASK_READS_LIMIT", "6"))
+    ADMISSION_TASK_READS_QUEUE: int = int(os.getenv("ADMISSION_TASK_READS_QUEUE", "100"))
+    ADMISSION_WEATHER_LIMIT: int = int(os.getenv("ADMISSION_WEATHER_LIMIT", "16"))
+    ADMISSION_WEATHER_QUEUE: int = int(os.getenv("ADMISSION_WEATHER_QUEUE", "32"))
+    ADMISSION_SSE_LIMIT: int = int(os.getenv("ADMISSION_SSE_LIMIT", "50"))
+    ADMISSION_SSE_QUEUE: int = int(os.getenv("ADMISSION_SSE_QUEUE", "0"))  # conexiones largas: sin espera
+    ADMISSION_QUEUE_TIMEOUT_MS: int = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "5000"))
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+    
     # Performance
     WEATHER_CACHE_DURATION: int = 300  # 5 minutes
+    WEATHER_BATCH_CONCURRENCY: int = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "4"))  # consultas simultáneas por lote
+    WEATHER_BATCH_MAX_LOCATIONS: int = 50
+    
+    # Precarga de clima por popularidad
+    WEATHER_PREFETCH_ENABLED: bool = os.getenv("WEATHER_PREFETCH_ENABLED", "true").lower() == "true"
+    WEATHER_PREFETCH_TOP_N: int = int(os.getenv("WEATHER_PREFETCH_TOP_N", "5"))
+    WEATHER_PREFETCH_LEAD_SECONDS: int = 60  # refrescar este tiempo antes de expirar
+    WEATHER_PREFETCH_INTERVAL_SECONDS: int = 30
+    WEATHER_PREFETCH_BUDGET_PER_HOUR: int = int(os.getenv("WEATHER_PREFETCH_BUDGET_PER_HOUR", "60"))  # por proveedor
+    WEATHER_PREFETCH_WARM_CITIES: list = [
+        city.strip() for city in os.getenv("WEATHER_PREFETCH_WARM_CITIES", "Lima").split(",") if city.strip()
+    ]
+    WEATHER_POPULARITY_HALF_LIFE: int = 3600  # segundos
+    WEATHER_POPULARITY_MAX_KEYS: int = 1000
+    EXPORT_CHUNK_SIZE: int = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))  # filas por lote al exportar
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))  # filas por transacción al importar
+    IMPORT_MAX_ERRORS: int = 100  # errores reportados como máximo por importación
     
 settings = Settings()
\ No newline at end of file
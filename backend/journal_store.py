@@ -0,0 +1,470 @@
+"""
+Motor de almacenamiento alternativo a SQLite: tareas en memoria con journal append-only.
+
+Cada mutación se escribe como una línea JSON al final del journal (una sola
+escritura y, opcionalmente, un fsync) y se aplica a estructuras en memoria con
+índices por ID, estado y fecha de creación. Periódicamente se compacta el
+journal en un snapshot; al arrancar se recupera el snapshot y se repite el journal.
+"""
+import asyncio
+import bisect
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+
+class TaskRecord:
+    """Tarea en memoria (mismos campos que models.Task)"""
+    __slots__ = (
+        "id", "titulo", "descripcion", "estado", "fecha_creacion",
+        "version", "fecha_actualizacion", "seq", "fecha_completada"
+    )
+
+    # Las tareas del journal nunca están archivadas (mismo esquema que TaskResponse)
+    archivada = False
+    # Sin orden manual: el journal solo ordena por fecha de creación
+    rank = None
+
+    def __init__(self, id, titulo, descripcion, estado, fecha_creacion,
+                 version, fecha_actualizacion, seq, fecha_completada):
+        self.id = id
+        self.titulo = titulo
+        self.descripcion = descripcion
+        self.estado = estado
+        self.fecha_creacion = fecha_creacion
+        self.version = version
+        self.fecha_actualizacion = fecha_actualizacion
+        self.seq = seq
+        self.fecha_completada = fecha_completada
+
+    def copy(self) -> "TaskRecord":
+        return TaskRecord(*(getattr(self, name) for name in self.__slots__))
+
+    def to_row(self) -> list:
+        """Fila compacta para el journal y el snapshot (fechas en ISO 8601)"""
+        return [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in (getattr(self, name) for name in self.__slots__)
+        ]
+
+    @classmethod
+    def from_row(cls, row: list) -> "TaskRecord":
+        record = cls(*row)
+        for name in ("fecha_creacion", "fecha_actualizacion", "fecha_completada"):
+            value = getattr(record, name)
+            if value is not None:
+                setattr(record, name, datetime.fromisoformat(value))
+        return record
+
+class Tombstone:
+    """Marca de eliminación para la sincronización delta"""
+    __slots__ = ("id", "seq", "fecha")
+
+    archivada = False
+
+    def __init__(self, id: int, seq: int, fecha: datetime):
+        self.id = id
+        self.seq = seq
+        self.fecha = fecha
+
+class VersionConflict(Exception):
+    """La versión esperada (If-Match) no coincide con la actual"""
+
+    def __init__(self, current_version: int):
+        super().__init__(current_version)
+        self.current_version = current_version
+
+class JournalTaskStore:
+    """
+    Tareas en memoria persistidas en un journal append-only con snapshots.
+
+    Índices:
+      - por ID: dict id -> TaskRecord
+      - por fecha de creación: lista ordenada de (fecha_creacion, id), global y por estado
+      - por secuencia de cambios: OrderedDict id -> seq en orden de seq (tareas y tombstones)
+    """
+
+    def __init__(self, directory: str, fsync_interval_ms: int, compact_every: int):
+        self.journal_path = os.path.join(directory, "tasks.journal")
+        self.snapshot_path = os.path.join(directory, "tasks.snapshot")
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._journal = None
+        self._reset()
+        self.stats = {"writes": 0, "fsyncs": 0, "compactions": 0, "recovered_entries": 0}
+
+    def _reset(self):
+        self.tasks: Dict[int, TaskRecord] = {}
+        self.tombstones: Dict[int, Tombstone] = {}
+        self.by_creation: List[Tuple[datetime, int]] = []
+        self.by_estado: Dict[str, List[Tuple[datetime, int]]] = {"pendiente": [], "completada": []}
+        self.changes: "OrderedDict[int, int]" = OrderedDict()
+        self.daily: Dict[date, List[int]] = {}  # fecha -> [creadas, completadas]
+        self.next_id = 1
+        self.seq = 0
+        self.entries_since_snapshot = 0
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+
+    # --- Recuperación y persistencia ---
+
+    def open(self):
+        """Recupera el estado (snapshot + journal) y abre el journal para escritura"""
+        with self._lock:
+            if self._journal is not None:
+                return
+            self._reset()
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            if os.path.exists(self.snapshot_path):
+                self._load_snapshot()
+            snapshot_seq = self.seq
+            # Un journal rotado existe solo si se interrumpió una compactación
+            for path in (self.journal_path + ".compacting", self.journal_path):
+                if os.path.exists(path):
+                    self._replay(path, snapshot_seq)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def close(self):
+        """Sincroniza el journal a disco y lo cierra"""
+        with self._lock:
+            if self._journal is None:
+                return
+            self._sync()
+            self._journal.close()
+            self._journal = None
+
+    def _load_snapshot(self):
+        with open(self.snapshot_path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        for row in snapshot["tasks"]:
+            self._index(TaskRecord.from_row(row))
+        for task_id, seq, fecha in snapshot["tombstones"]:
+            self.tombstones[task_id] = Tombstone(task_id, seq, datetime.fromisoformat(fecha))
+        # Orden global por seq para el índice de cambios
+        ordered = sorted(
+            [(record.seq, record.id) for record in self.tasks.values()]
+            + [(tombstone.seq, tombstone.id) for tombstone in self.tombstones.values()]
+        )
+        self.changes = OrderedDict((task_id, seq) for seq, task_id in ordered)
+        self.daily = {date.fromisoformat(day): counts for day, counts in snapshot["daily"].items()}
+        self.next_id = snapshot["next_id"]
+        self.seq = snapshot["seq"]
+
+    def _replay(self, path: str, snapshot_seq: int):
+        """
+        Aplica las entradas posteriores al snapshot. Una última línea incompleta
+        (caída durante una escritura) se descarta truncando el archivo.
+        """
+        valid_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("línea incompleta")
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                valid_bytes += len(line)
+                if entry["seq"] <= snapshot_seq:
+                    continue
+                self._apply(entry)
+                self.entries_since_snapshot += 1
+                self.stats["recovered_entries"] += 1
+        if valid_bytes < os.path.getsize(path):
+            print(f"[Journal] Descartada entrada incompleta al final de {path}")
+            os.truncate(path, valid_bytes)
+
+    def _append(self, entries: List[dict]):
+        """Escribe las entradas al final del journal en una sola escritura"""
+        self._journal.write("".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries))
+        self._journal.flush()
+        self._dirty = True
+        self.stats["writes"] += 1
+        self.entries_since_snapshot += len(entries)
+        if self.fsync_interval <= 0 or time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self):
+        if self._dirty:
+            os.fsync(self._journal.fileno())
+            self._dirty = False
+            self.stats["fsyncs"] += 1
+        self._last_fsync = time.monotonic()
+
+    def sync(self):
+        """fsync pendiente del journal (modo con intervalo)"""
+        with self._lock:
+            if self._journal is not None:
+                self._sync()
+
+    def compact(self):
+        """
+        Escribe un snapshot con el estado actual y descarta el journal.
+        Bajo el lock solo se copian referencias y se rota el journal;
+        la serialización y escritura del snapshot ocurren fuera del lock.
+        """
+        with self._lock:
+            if self._journal is None or self.entries_since_snapshot == 0:
+                return
+            seq, next_id = self.seq, self.next_id
+            records = list(self.tasks.values())
+            tombstones = list(self.tombstones.values())
+            daily = {day: list(counts) for day, counts in self.daily.items()}
+            self._sync()
+            self._journal.close()
+            rotated = self.journal_path + ".compacting"
+            if os.path.exists(rotated):
+                # Compactación anterior interrumpida: sus entradas aún no están en el
+                # snapshot, así que el journal se agrega a continuación en lugar de reemplazarlo
+                with open(rotated, "ab") as dst, open(self.journal_path, "rb") as src:
+                    shutil.copyfileobj(src, dst)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, rotated)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self.entries_since_snapshot = 0
+
+        snapshot = {
+            "seq": seq,
+            "next_id": next_id,
+            "tasks": [record.to_row() for record in records],
+            "tombstones": [[t.id, t.seq, t.fecha.isoformat()] for t in tombstones],
+            "daily": {day.isoformat(): counts for day, counts in daily.items()}
+        }
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        os.remove(rotated)
+        self.stats["compactions"] += 1
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.entries_since_snapshot >= self.compact_every
+
+    # --- Aplicación de entradas (escritura en vivo y recuperación) ---
+
+    def _index(self, record: TaskRecord):
+        self.tasks[record.id] = record
+        key = (record.fecha_creacion, record.id)
+        bisect.insort(self.by_creation, key)
+        bisect.insort(self.by_estado.setdefault(record.estado, []), key)
+
+    def _unindex(self, record: TaskRecord):
+        key = (record.fecha_creacion, record.id)
+        for keys in (self.by_creation, self.by_estado[record.estado]):
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+
+    def _bump_daily(self, moment: Optional[datetime], creadas: int, completadas: int):
+        if moment is None:
+            return
+        counts = self.daily.setdefault(moment.date(), [0, 0])
+        counts[0] += creadas
+        counts[1] += completadas
+
+    def _record_change(self, task_id: int, seq: int):
+        self.changes[task_id] = seq
+        self.changes.move_to_end(task_id)
+        self.seq = max(self.seq, seq)
+
+    def _apply(self, entry: dict, record: Optional[TaskRecord] = None):
+        """
+        Aplica una entrada del journal: 'put' (estado completo de la tarea) o 'del'.
+        Las escrituras en vivo pasan el registro ya construido para no volver a decodificarlo.
+        Los registros aplicados no se modifican después (una actualización crea una copia).
+        """
+        if entry["op"] == "put":
+            record = record or TaskRecord.from_row(entry["task"])
+            previous = self.tasks.get(record.id)
+            if previous is None:
+                self._bump_daily(record.fecha_creacion, 1, 0)
+                self._bump_daily(record.fecha_completada, 0, 1)
+                self.tombstones.pop(record.id, None)
+                self._index(record)
+            else:
+                if previous.fecha_completada != record.fecha_completada:
+                    self._bump_daily(previous.fecha_completada, 0, -1)
+                    self._bump_daily(record.fecha_completada, 0, 1)
+                if previous.estado != record.estado:
+                    self._unindex(previous)
+                    self._index(record)
+                else:
+                    self.tasks[record.id] = record
+            self.next_id = max(self.next_id, record.id + 1)
+        else:
+            record = self.tasks.pop(entry["id"], None)
+            if record is not None:
+                self._unindex(record)
+            self.tombstones[entry["id"]] = Tombstone(entry["id"], entry["seq"], datetime.fromisoformat(entry["fecha"]))
+        self._record_change(entry["id"] if entry["op"] == "del" else record.id, entry["seq"])
+
+    def _put_entry(self, record: TaskRecord) -> dict:
+        return {"op": "put", "seq": record.seq, "task": record.to_row()}
+
+    # --- Operaciones de tareas ---
+
+    def create(self, titulo: str, descripcion: str = "", estado: str = "pendiente") -> TaskRecord:
+        """Crea una tarea nueva"""
+        return self.create_many([{"titulo": titulo, "descripcion": descripcion, "estado": estado}])[0]
+
+    def create_many(self, rows: List[dict]) -> List[TaskRecord]:
+        """Crea varias tareas con una sola escritura al journal (importación)"""
+        with self._lock:
+            now = datetime.utcnow()
+            records = []
+            for row in rows:
+                self.seq += 1
+                records.append(TaskRecord(
+                    id=self.next_id + len(records),
+                    titulo=row["titulo"],
+                    descripcion=row.get("descripcion", ""),
+                    estado=row.get("estado", "pendiente"),
+                    fecha_creacion=row.get("fecha_creacion") or now,
+                    version=1,
+                    fecha_actualizacion=now,
+                    seq=self.seq,
+                    fecha_completada=row.get("fecha_completada")
+                ))
+            self._append([self._put_entry(record) for record in records])
+            for record in records:
+                self._apply({"op": "put", "seq": record.seq}, record)
+            return records
+
+    def get(self, task_id: int) -> Optional[TaskRecord]:
+        return self.tasks.get(task_id)
+
+    def list(self, estado: Optional[str] = None, limit: Optional[int] = None,
+             position: Optional[Tuple[datetime, int]] = None) -> List[TaskRecord]:
+        """Tareas de la más reciente a la más antigua, con paginación keyset opcional"""
+        with self._lock:
+            keys = self.by_creation if estado is None else self.by_estado.get(estado, [])
+            end = bisect.bisect_left(keys, position) if position is not None else len(keys)
+            start = max(0, end - limit) if limit is not None else 0
+            return [self.tasks[task_id] for _, task_id in reversed(keys[start:end])]
+
+    def update(self, task_id: int, values: Dict[str, Any], expected_version: Optional[int] = None) -> Optional[TaskRecord]:
+        """
+        Actualiza campos de una tarea (None si no existe; VersionConflict si la versión no coincide).
+        Al cambiar el estado se fija o se borra fecha_completada.
+        """
+        with self._lock:
+            current = self.tasks.get(task_id)
+            if current is None:
+                return None
+            if expected_version is not None and current.version != expected_version:
+                raise VersionConflict(current.version)
+
+            record = current.copy()
+            for field, value in values.items():
+                setattr(record, field, value)
+            if record.estado != current.estado:
+                record.fecha_completada = datetime.utcnow() if record.estado == "completada" else None
+            record.version = current.version + 1
+            record.fecha_actualizacion = datetime.utcnow()
+            self.seq += 1
+            record.seq = self.seq
+
+            entry = self._put_entry(record)
+            self._append([entry])
+            self._apply(entry, record)
+            return record
+
+    def delete(self, task_id: int, expected_version: Optional[int] = None) -> Optional[TaskRecord]:
+        """Elimina una tarea y deja su tombstone (None si no existe)"""
+        with self._lock:
+            current = self.tasks.get(task_id)
+            if current is None:
+                return None
+            if expected_version is not None and current.version != expected_version:
+                raise VersionConflict(current.version)
+
+            self.seq += 1
+            entry = {"op": "del", "seq": self.seq, "id": task_id, "fecha": datetime.utcnow().isoformat()}
+            self._append([entry])
+            self._apply(entry)
+            return current
+
+    def changes_since(self, since: int, limit: int) -> Tuple[List[TaskRecord], List[Tombstone], bool]:
+        """Cambios con seq > since en orden de seq (cada cambio tiene un seq único)"""
+        with self._lock:
+            pending = []
+            for task_id in reversed(self.changes):
+                seq = self.changes[task_id]
+                if seq <= since:
+                    break
+                pending.append(task_id)
+            pending.reverse()
+            has_more = len(pending) > limit
+            changed, deleted = [], []
+            for task_id in pending[:limit]:
+                if task_id in self.tasks:
+                    changed.append(self.tasks[task_id])
+                else:
+                    deleted.append(self.tombstones[task_id])
+            return changed, deleted, has_more
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[List[TaskRecord]]:
+        """Recorre las tareas por ID en lotes (para la exportación)"""
+        with self._lock:
+            ids = sorted(self.tasks)
+        for start in range(0, len(ids), chunk_size):
+            chunk = [self.tasks.get(task_id) for task_id in ids[start:start + chunk_size]]
+            yield [record for record in chunk if record is not None]
+
+    def counts(self) -> Dict[str, int]:
+        """Conteo por estado a partir de los índices"""
+        with self._lock:
+            return {estado: len(keys) for estado, keys in self.by_estado.items()}
+
+    def daily_stats(self, desde: date, hasta: date) -> Dict[date, Tuple[int, int]]:
+        """Resumen diario (creadas, completadas) entre dos fechas inclusive"""
+        with self._lock:
+            return {day: tuple(counts) for day, counts in self.daily.items() if desde <= day <= hasta}
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "tasks": len(self.tasks),
+            "seq": self.seq,
+            "entries_since_snapshot": self.entries_since_snapshot
+        }
+
+async def journal_loop():
+    """
+    Tarea en segundo plano: fsync periódico (modo con intervalo) y compactación
+    """
+    interval = min(task_store.fsync_interval, 1.0) if task_store.fsync_interval > 0 else 1.0
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            task_store.sync()
+            if task_store.needs_compaction:
+                await run_in_threadpool(task_store.compact)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Journal] Error en mantenimiento del journal: {e}")
+
+# Instancia global (None cuando el motor configurado es SQLite)
+task_store: Optional[JournalTaskStore] = None
+if settings.STORAGE_BACKEND == "journal":
+    task_store = JournalTaskStore(
+        settings.JOURNAL_DIR,
+        fsync_interval_ms=settings.JOURNAL_FSYNC_INTERVAL_MS,
+        compact_every=settings.JOURNAL_COMPACT_EVERY
+    )
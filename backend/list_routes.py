@@ -0,0 +1,400 @@
+"""
+Endpoints API para listas de tareas (proyectos) y sus tareas.
+
+Las tareas de cada lista viven en la base SQLite de su shard, así que las
+escrituras de listas en shards distintos no compiten por el mismo lock.
+El trabajo con la base se ejecuta en el threadpool para que varios shards
+escriban en paralelo.
+
+Las tareas de listas no entran en /api/stats, /api/stats/history ni en el
+archivado (que trabajan sobre la base principal): cada lista tiene su propia
+sincronización delta (/lists/{id}/tasks/changes) y estadísticas (/lists/{id}/stats).
+"""
+from fastapi import APIRouter, HTTPException, Depends, Header, Response, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from pydantic import BaseModel
+from datetime import datetime
+
+from models import Task, TaskList, TaskTombstone, get_db, SessionLocal
+from routes import (
+    TaskCreate, TaskUpdate, TaskResponse, TaskMove, TaskChanges, FIELD_COLUMNS, SORT_KEYS,
+    _parse_fields, _project, _task_list_select, _parse_sort, _encode_cursor, _decode_cursor,
+    _parse_if_match, _etag, _conflict_error, _patch_values, _with_completion_date,
+    _parse_move, _check_version, _move_rank, _changes_since, _insert_tombstone
+)
+from ranking import top_rank
+from shards import shard_router
+from task_cache import task_cache
+from journal_store import task_store
+
+def _require_sqlite_backend():
+    """Las listas usan shards SQLite: no están disponibles con el motor journal"""
+    if task_store is not None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Las listas de tareas requieren STORAGE_BACKEND=sqlite"
+        )
+
+# Router para las rutas de listas
+router = APIRouter(dependencies=[Depends(_require_sqlite_backend)])
+
+# Schemas de Pydantic para validación
+class TaskListCreate(BaseModel):
+    nombre: str
+    descripcion: str = ""
+
+class TaskListResponse(BaseModel):
+    id: int
+    nombre: str
+    descripcion: Optional[str] = None
+    shard: int
+    fecha_creacion: datetime
+
+    class Config:
+        from_attributes = True
+
+def _resolve_shard(list_id: int) -> int:
+    """Shard de una lista (404 si no existe)"""
+    db = SessionLocal()
+    try:
+        shard = db.execute(select(TaskList.shard).where(TaskList.id == list_id)).scalar()
+    finally:
+        db.close()
+    if shard is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Lista con ID {list_id} no encontrada"
+        )
+    return shard
+
+def _in_shard(list_id: int, work):
+    """Ejecuta work(session) en la base del shard de la lista y confirma la transacción"""
+    session = shard_router.session(_resolve_shard(list_id))
+    try:
+        result = work(session)
+        session.commit()
+        return result
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def _raise_list_conflict(session: Session, list_id: int, task_id: int, expected_version: Optional[int]):
+    """404 o 412 para una escritura condicional que no afectó filas dentro de la lista"""
+    current_version = session.execute(
+        select(Task.version).where(Task.id == task_id, Task.lista_id == list_id)
+    ).scalar()
+    raise _conflict_error(task_id, current_version, expected_version)
+
+@router.post("/lists", response_model=TaskListResponse, status_code=status.HTTP_201_CREATED)
+async def crear_lista(lista: TaskListCreate, db: Session = Depends(get_db)):
+    """
+    Crea una lista de tareas y le asigna un shard
+    """
+    try:
+        db_list = TaskList(nombre=lista.nombre, descripcion=lista.descripcion, shard=0)
+        db.add(db_list)
+        db.flush()
+        db_list.shard = shard_router.shard_for_list(db_list.id)
+        task_cache.commit(db)
+        return db_list
+
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al crear la lista"
+        )
+
+@router.get("/lists", response_model=List[TaskListResponse])
+async def listar_listas(db: Session = Depends(get_db)):
+    """
+    Obtiene todas las listas de tareas
+    """
+    return db.query(TaskList).order_by(TaskList.id).all()
+
+@router.delete("/lists/{list_id}")
+async def eliminar_lista(list_id: int, db: Session = Depends(get_db)):
+    """
+    Elimina una lista y todas sus tareas de la base de su shard.
+    Sus marcas de eliminación mantienen creciente el seq del shard para las demás listas.
+    """
+    db_list = db.query(TaskList).filter(TaskList.id == list_id).first()
+    if not db_list:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Lista con ID {list_id} no encontrada"
+        )
+    shard, nombre = db_list.shard, db_list.nombre
+
+    # Primero la lista (no se pueden crear más tareas en ella) y luego sus tareas
+    db.delete(db_list)
+    task_cache.commit(db)
+
+    def work():
+        session = shard_router.session(shard)
+        try:
+            session.execute(
+                insert(TaskTombstone).prefix_with("OR REPLACE").from_select(
+                    ["task_id", "lista_id"],
+                    select(Task.id, Task.lista_id).where(Task.lista_id == list_id)
+                )
+            )
+            deleted = session.execute(delete(Task).where(Task.lista_id == list_id)).rowcount
+            session.commit()
+            return deleted
+        finally:
+            session.close()
+
+    eliminadas = await run_in_threadpool(work)
+    return {"message": f"Lista '{nombre}' eliminada correctamente", "tareas_eliminadas": eliminadas}
+
+@router.get("/lists/{list_id}/stats")
+async def estadisticas_lista(list_id: int):
+    """
+    Estadísticas de las tareas de una lista (mismo formato que /api/stats)
+    """
+    def work(session: Session):
+        stmt = select(Task.estado, func.count()).where(Task.lista_id == list_id).group_by(Task.estado)
+        return dict(session.execute(stmt).all())
+
+    try:
+        counts = await run_in_threadpool(_in_shard, list_id, work)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al obtener las estadísticas de la lista"
+        )
+    total = sum(counts.values())
+    completadas = counts.get("completada", 0)
+    return {
+        "total": total,
+        "pendientes": counts.get("pendiente", 0),
+        "completadas": completadas,
+        "porcentaje_completadas": round((completadas / total * 100) if total > 0 else 0, 1)
+    }
+
+@router.get("/lists/{list_id}/tasks", response_model=List[TaskResponse])
+async def listar_tareas_lista(
+    list_id: int,
+    response: Response,
+    estado: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: str = "fecha"
+):
+    """
+    Tareas de una lista, de la más reciente a la más antigua o en el orden
+    manual con sort=rank (mismos parámetros que /tasks)
+    """
+    if estado is not None and estado not in ["pendiente", "completada"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Estado debe ser 'pendiente' o 'completada'"
+        )
+    if limit is not None:
+        limit = max(1, min(limit, 1000))
+    sort = _parse_sort(sort)
+    position = _decode_cursor(cursor, sort) if cursor else None
+    selected = _parse_fields(fields, FIELD_COLUMNS)
+    names = FIELD_COLUMNS + ["lista_id"] if selected is None else (
+        selected + [name for name in SORT_KEYS[sort] if limit is not None and name not in selected]
+    )
+
+    def work(session: Session):
+        stmt = _task_list_select(names, estado, position, limit, sort).where(Task.lista_id == list_id)
+        return session.execute(stmt).all()
+
+    try:
+        tasks = await run_in_threadpool(_in_shard, list_id, work)
+        headers = {}
+        if limit is not None and len(tasks) == limit:
+            headers["X-Next-Cursor"] = _encode_cursor(tasks[-1], sort)
+        if selected is not None:
+            return JSONResponse([_project(task, selected) for task in tasks], headers=headers)
+        response.headers.update(headers)
+        return tasks
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al obtener las tareas de la lista"
+        )
+
+@router.post("/lists/{list_id}/tasks", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
+async def crear_tarea_lista(list_id: int, task: TaskCreate):
+    """
+    Crea una tarea en la lista (un solo INSERT ... RETURNING en la base del shard)
+    """
+    def work(session: Session):
+        stmt = insert(Task).values(
+            titulo=task.titulo,
+            descripcion=task.descripcion,
+            estado="pendiente",
+            lista_id=list_id,
+            rank=top_rank(session)
+        ).returning(*Task.__table__.c)
+        return session.execute(stmt).first()
+
+    try:
+        return await run_in_threadpool(_in_shard, list_id, work)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al crear la tarea"
+        )
+
+@router.get("/lists/{list_id}/tasks/changes", response_model=TaskChanges)
+async def cambios_tareas_lista(list_id: int, since: int = 0, limit: int = 1000):
+    """
+    Sincronización delta de una lista (mismos parámetros que /tasks/changes).
+    Las secuencias son del shard de la lista, no comparables con las de /tasks/changes.
+    """
+    limit = max(1, min(limit, 10000))
+    try:
+        return await run_in_threadpool(
+            _in_shard, list_id, lambda session: _changes_since(session, since, limit, list_id)
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al obtener los cambios de la lista"
+        )
+
+@router.get("/lists/{list_id}/tasks/{task_id}", response_model=TaskResponse)
+async def obtener_tarea_lista(list_id: int, task_id: int, response: Response):
+    """
+    Busca una tarea de la lista por su ID
+    """
+    def work(session: Session):
+        stmt = select(*Task.__table__.c).where(Task.id == task_id, Task.lista_id == list_id)
+        return session.execute(stmt).first()
+
+    task = await run_in_threadpool(_in_shard, list_id, work)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tarea con ID {task_id} no encontrada"
+        )
+    response.headers["ETag"] = _etag(task.version)
+    return task
+
+@router.patch("/lists/{list_id}/tasks/{task_id}", response_model=TaskResponse)
+async def modificar_tarea_lista(
+    list_id: int,
+    task_id: int,
+    task_update: TaskUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
+    """
+    Actualiza parcialmente una tarea de la lista (If-Match opcional, 412 si cambió)
+    """
+    expected_version = _parse_if_match(if_match)
+    values = _with_completion_date(_patch_values(task_update))
+
+    def work(session: Session):
+        stmt = update(Task).where(Task.id == task_id, Task.lista_id == list_id)
+        if expected_version is not None:
+            stmt = stmt.where(Task.version == expected_version)
+        stmt = stmt.values(**values, version=Task.version + 1).returning(*Task.__table__.c)
+
+        row = session.execute(stmt).first()
+        if row is None:
+            _raise_list_conflict(session, list_id, task_id, expected_version)
+        return row
+
+    try:
+        updated = await run_in_threadpool(_in_shard, list_id, work)
+        response.headers["ETag"] = _etag(updated.version)
+        return updated
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al actualizar la tarea"
+        )
+
+@router.post("/lists/{list_id}/tasks/{task_id}/move", response_model=TaskResponse)
+async def mover_tarea_lista(
+    list_id: int,
+    task_id: int,
+    move: TaskMove,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
+    """
+    Cambia la posición de una tarea dentro del orden manual de su lista
+    (la referencia debe pertenecer a la misma lista)
+    """
+    expected_version = _parse_if_match(if_match)
+    _parse_move(task_id, move)
+    in_list = Task.lista_id == list_id
+
+    def work(session: Session):
+        _check_version(session, task_id, expected_version, in_list)
+        rank = _move_rank(session, task_id, move, in_list)
+        stmt = (
+            update(Task).where(Task.id == task_id, in_list)
+            .values(rank=rank, version=Task.version + 1)
+            .returning(*Task.__table__.c)
+        )
+        row = session.execute(stmt).first()
+        if row is None:
+            _raise_list_conflict(session, list_id, task_id, expected_version)
+        return row
+
+    try:
+        updated = await run_in_threadpool(_in_shard, list_id, work)
+        response.headers["ETag"] = _etag(updated.version)
+        return updated
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al mover la tarea"
+        )
+
+@router.delete("/lists/{list_id}/tasks/{task_id}")
+async def eliminar_tarea_lista(list_id: int, task_id: int, if_match: Optional[str] = Header(None)):
+    """
+    Elimina una tarea de la lista (If-Match opcional, 412 si cambió)
+    """
+    expected_version = _parse_if_match(if_match)
+    in_list = Task.lista_id == list_id
+
+    def work(session: Session):
+        _insert_tombstone(session, task_id, expected_version, in_list)
+        return session.execute(delete(Task).where(Task.id == task_id, in_list).returning(Task.titulo)).scalar()
+
+    try:
+        titulo_tarea = await run_in_threadpool(_in_shard, list_id, work)
+        return {"message": f"Tarea '{titulo_tarea}' eliminada correctamente"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al eliminar la tarea"
+        )
@@ -9,20 +9,72 @@ app.add_middleware(
 ) gestión de tareas con información climática
 Desarrollado con FastAPI, SQLAlchemy y APIs de clima externas
 """
-from fastapi import FastAPI, Request, Depends
+import time
+
+# Inicio del arranque (para el reporte de tiempos de cold start)
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Request, Depends, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import asyncio
+import importlib
 import os
 from pathlib import Path
 
 # Importar módulos locales
-from models import create_tables, get_db, Task, SessionLocal
+from models import create_tables, get_db, Task, ArchivedTask, TaskDailyStats, SessionLocal
 from routes import router as tasks_router
-from weather import get_current_weather, get_current_weather_by_coords
+from list_routes import router as lists_router
+from shards import shard_router
+from archive import archive_loop
+from admission import AdmissionMiddleware, admission_controller
+from ranking import fill_missing_ranks, rank_rebalance_loop
+from write_queue import write_queue
+from task_cache import task_cache
+from journal_store import task_store, journal_loop
 from config import settings
 
+# Tareas asyncio en segundo plano iniciadas al arrancar
+background_tasks = []
+
+# Módulo de clima (en modo FAST_START se importa en la primera llamada a /api/weather)
+_weather_module = None
+
+def get_weather_module():
+    """Importa el subsistema de clima (y httpx) solo cuando se necesita"""
+    global _weather_module
+    if _weather_module is None:
+        _weather_module = importlib.import_module("weather")
+        if settings.FAST_START:
+            # En arranque rápido la precarga empieza con la primera consulta de clima
+            start_weather_prefetch()
+    return _weather_module
+
+def start_weather_prefetch():
+    """Inicia el planificador de precarga de clima en segundo plano"""
+    if not settings.WEATHER_PREFETCH_ENABLED or _weather_module is None:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    background_tasks.append(asyncio.create_task(_weather_module.weather_prefetcher.run()))
+
+if not settings.FAST_START:
+    get_weather_module()
+
+# Tiempos de arranque en milisegundos: import, init de BD y datos de ejemplo
+startup_timings = {
+    "fast_start": settings.FAST_START,
+    "import_ms": round((time.perf_counter() - _import_started) * 1000, 1)
+}
+
 # Configurar aplicación FastAPI con metadatos
 app = FastAPI(
     title=settings.APP_NAME,
@@ -31,6 +83,10 @@ app = FastAPI(
     debug=settings.DEBUG
 )
 
+# Control de admisión por clase de ruta. Se registra antes que CORS para quedar
+# por dentro: los 503 llevan cabeceras CORS y los preflight no ocupan lugares
+app.add_middleware(AdmissionMiddleware)
+
 # Configurar CORS para permitir requests del frontend
 app.add_middleware(
     CORSMiddleware,
@@ -40,68 +96,147 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Incluir rutas de tareas
+# Incluir rutas de tareas y de listas
 app.include_router(tasks_router, prefix="/api", tags=["tasks"])
+app.include_router(lists_router, prefix="/api", tags=["lists"])
 
 @app.on_event("startup")
 async def startup_event():
     """
     Inicializar la aplicación y crear tareas de ejemplo
     """
-    # Crear tablas de base de datos
-    create_tables()
+    # Crear tablas de base de datos (solo si cambió la versión del esquema)
+    started = time.perf_counter()
+    schema_updated = create_tables()
+    if task_store is not None:
+        # Motor journal: recuperar snapshot + journal
+        task_store.open()
+    startup_timings["db_init_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    startup_timings["schema_updated"] = schema_updated
     
     # Crear tareas de ejemplo si no existen
+    started = time.perf_counter()
+    if settings.SEED_SAMPLE_TASKS:
+        seed_sample_tasks()
+    startup_timings["seed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    startup_timings["total_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+    
+    # Escritor único con commit agrupado
+    if settings.WRITE_QUEUE_ENABLED:
+        write_queue.start()
+    
+    # Precarga de clima por popularidad (en FAST_START se difiere)
+    if not settings.FAST_START:
+        start_weather_prefetch()
+    
+    # Mantenimiento del journal (fsync por intervalo y compactación)
+    if task_store is not None:
+        background_tasks.append(asyncio.create_task(journal_loop()))
+    
+    # Archivado periódico de tareas completadas antiguas (solo con SQLite)
+    if settings.ARCHIVE_ENABLED and task_store is None:
+        background_tasks.append(asyncio.create_task(archive_loop()))
+    
+    # Rebalanceo de las claves del orden manual cuando crecen demasiado (solo con SQLite)
+    if task_store is None:
+        background_tasks.append(asyncio.create_task(rank_rebalance_loop()))
+    
+    print(
+        f"TaskTracker iniciado correctamente en {startup_timings['total_ms']} ms "
+        f"(import {startup_timings['import_ms']} ms, BD {startup_timings['db_init_ms']} ms, "
+        f"ejemplos {startup_timings['seed_ms']} ms)"
+    )
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Detener las tareas en segundo plano
+    """
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    await write_queue.stop()
+    if task_store is not None:
+        task_store.close()
+    shard_router.dispose()
+
+def _sample_tasks() -> List[Task]:
+    """Tareas de ejemplo para una base de datos vacía"""
+    return [
+        Task(
+            titulo="Probar TaskTracker",
+            descripcion="Explorar todas las funcionalidades de la aplicación",
+            estado="pendiente"
+        ),
+        Task(
+            titulo="Crear mi primera tarea",
+            descripcion="Usar el formulario para agregar una tarea personalizada",
+            estado="pendiente"
+        ),
+        Task(
+            titulo="Revisar el clima",
+            descripcion="Verificar que el widget de clima muestre información actualizada",
+            estado="completada",
+            fecha_completada=datetime.utcnow()
+        ),
+        Task(
+            titulo="Explorar la documentación",
+            descripcion="Hacer clic en el botón 'Docs' para ver la API en Swagger",
+            estado="pendiente"
+        ),
+        Task(
+            titulo="Marcar tarea como completada",
+            descripcion="Usar el checkbox para cambiar el estado de una tarea",
+            estado="completada",
+            fecha_completada=datetime.utcnow()
+        )
+    ]
+
+def seed_sample_tasks():
+    """
+    Crea tareas de ejemplo si la base de datos está vacía
+    """
+    if task_store is not None:
+        # Motor journal: mismas tareas de ejemplo en una sola escritura
+        if not task_store.tasks:
+            task_store.create_many([
+                {
+                    "titulo": task.titulo,
+                    "descripcion": task.descripcion,
+                    "estado": task.estado,
+                    "fecha_completada": task.fecha_completada
+                }
+                for task in _sample_tasks()
+            ])
+            print("Tareas de ejemplo creadas correctamente")
+        else:
+            print("Base de datos ya contiene tareas")
+        return
+    
     db = SessionLocal()
     try:
-        # Verificar si ya existen tareas
-        existing_tasks = db.query(Task).count()
+        # Verificar si ya existen tareas (sin contar toda la tabla)
+        has_tasks = db.query(Task.id).limit(1).first() is not None
         
-        if existing_tasks == 0:
+        if not has_tasks:
             # Crear tareas de ejemplo
-            sample_tasks = [
-                Task(
-                    titulo="Probar TaskTracker",
-                    descripcion="Explorar todas las funcionalidades de la aplicación",
-                    estado="pendiente"
-                ),
-                Task(
-                    titulo="Crear mi primera tarea",
-                    descripcion="Usar el formulario para agregar una tarea personalizada",
-                    estado="pendiente"
-                ),
-                Task(
-                    titulo="Revisar el clima",
-                    descripcion="Verificar que el widget de clima muestre información actualizada",
-                    estado="completada"
-                ),
-                Task(
-                    titulo="Explorar la documentación",
-                    descripcion="Hacer clic en el botón 'Docs' para ver la API en Swagger",
-                    estado="pendiente"
-                ),
-                Task(
-                    titulo="Marcar tarea como completada",
-                    descripcion="Usar el checkbox para cambiar el estado de una tarea",
-                    estado="completada"
-                )
-            ]
-            
-            for task in sample_tasks:
+            for task in _sample_tasks():
                 db.add(task)
+            db.flush()
+            # Posición en el orden manual (solo las de ejemplo: la base estaba vacía); las tareas
+            # anteriores a la columna rank las completa en lotes la tarea de rebalanceo
+            fill_missing_ranks(db.connection())
             
             db.commit()
             print("Tareas de ejemplo creadas correctamente")
         else:
-            print(f"Base de datos ya contiene {existing_tasks} tareas")
+            print("Base de datos ya contiene tareas")
             
     except Exception as e:
         print(f"Error creando tareas de ejemplo: {e}")
         db.rollback()
     finally:
         db.close()
-    
-    print("TaskTracker iniciado correctamente")
 
 @app.get("/")
 async def root():
@@ -116,24 +251,85 @@ async def root():
         "app": "/app",
         "endpoints": {
             "tasks": "/api/tasks",
+            "lists": "/api/lists",
             "weather": "/api/weather",
             "stats": "/api/stats",
-            "logs": "/api/logs"
+            "stats_history": "/api/stats/history",
+            "logs": "/api/logs",
+            "startup": "/api/startup",
+            "cache": "/api/cache",
+            "admission": "/api/admission"
         }
     }
 
+@app.get("/api/cache")
+async def cache_report():
+    """
+    Estadísticas de la caché de tareas (aciertos, fallos, tasa de aciertos)
+    """
+    return task_cache.report()
+
+@app.get("/api/admission")
+async def admission_report():
+    """
+    Estado del control de admisión por clase (en curso, en espera, rechazadas)
+    """
+    return admission_controller.report()
+
+@app.get("/api/startup")
+async def startup_report():
+    """
+    Reporte de tiempos de arranque (import, init de BD y datos de ejemplo)
+    """
+    return startup_timings
+
 @app.get("/api/weather")
 async def weather_endpoint(city: str = "Lima", lat: float = None, lon: float = None):
     """
     Endpoint para obtener información del clima
     Soporta tanto nombre de ciudad como coordenadas lat/lon
     """
+    weather = get_weather_module()
+    # El servicio devuelve el JSON ya codificado (los aciertos de cache no se serializan de nuevo)
     if lat is not None and lon is not None:
         # Usar coordenadas para mayor precisión
-        return await get_current_weather_by_coords(lat, lon)
+        body = await weather.get_current_weather_by_coords_body(lat, lon)
     else:
         # Fallback a nombre de ciudad
-        return await get_current_weather(city)
+        body = await weather.get_current_weather_body(city)
+    return Response(content=body, media_type="application/json")
+
+class WeatherLocation(BaseModel):
+    city: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+class WeatherBatchRequest(BaseModel):
+    locations: List[WeatherLocation]
+
+@app.post("/api/weather/batch")
+async def weather_batch_endpoint(batch: WeatherBatchRequest):
+    """
+    Clima para varias ciudades o coordenadas en una sola llamada.
+    Cada resultado indica su fuente (cache o upstream) y su antigüedad.
+    """
+    if not batch.locations or len(batch.locations) > settings.WEATHER_BATCH_MAX_LOCATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se requieren entre 1 y {settings.WEATHER_BATCH_MAX_LOCATIONS} ubicaciones"
+        )
+    for location in batch.locations:
+        if not location.city and (location.lat is None or location.lon is None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cada ubicación requiere 'city' o 'lat' y 'lon'"
+            )
+    
+    weather = get_weather_module()
+    results = await weather.get_current_weather_batch(
+        [location.model_dump(exclude_none=True) for location in batch.locations]
+    )
+    return {"results": results}
 
 @app.get("/api/stats")
 async def stats_endpoint(db: Session = Depends(get_db)):
@@ -142,9 +338,17 @@ async def stats_endpoint(db: Session = Depends(get_db)):
     """
     try:
         # Contar tareas por estado
-        total_tareas = db.query(Task).count()
-        tareas_pendientes = db.query(Task).filter(Task.estado == "pendiente").count()
-        tareas_completadas = db.query(Task).filter(Task.estado == "completada").count()
+        if task_store is not None:
+            counts = task_store.counts()
+            tareas_pendientes = counts.get("pendiente", 0)
+            tareas_completadas = counts.get("completada", 0)
+            total_tareas = sum(counts.values())
+        else:
+            # Las archivadas siguen contando (son tareas completadas movidas al archivo)
+            tareas_archivadas = db.query(ArchivedTask).count()
+            total_tareas = db.query(Task).count() + tareas_archivadas
+            tareas_pendientes = db.query(Task).filter(Task.estado == "pendiente").count()
+            tareas_completadas = db.query(Task).filter(Task.estado == "completada").count() + tareas_archivadas
         
         stats_data = {
             "total": total_tareas,
@@ -164,6 +368,57 @@ async def stats_endpoint(db: Session = Depends(get_db)):
             "error": "Error al obtener estadísticas"
         }
 
+@app.get("/api/stats/history")
+async def stats_history_endpoint(
+    desde: Optional[date] = Query(None, alias="from"),
+    hasta: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    """
+    Tareas creadas y completadas por día (UTC) entre dos fechas inclusive.
+    Lee solo el resumen diario: un año son ~365 filas sin importar el tamaño de tasks.
+    """
+    hasta = hasta or datetime.utcnow().date()
+    desde = desde or hasta - timedelta(days=29)
+    if desde > hasta:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' debe ser anterior o igual a 'to'"
+        )
+    if (hasta - desde).days >= settings.STATS_HISTORY_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango máximo es de {settings.STATS_HISTORY_MAX_DAYS} días"
+        )
+    
+    if task_store is not None:
+        by_day = task_store.daily_stats(desde, hasta)
+    else:
+        rows = db.query(TaskDailyStats).filter(
+            TaskDailyStats.fecha >= desde,
+            TaskDailyStats.fecha <= hasta
+        ).all()
+        by_day = {row.fecha: (row.creadas, row.completadas) for row in rows}
+    
+    # Días sin actividad se devuelven en cero para que la serie sea continua
+    dias = []
+    for offset in range((hasta - desde).days + 1):
+        dia = desde + timedelta(days=offset)
+        creadas, completadas = by_day.get(dia, (0, 0))
+        dias.append({
+            "fecha": dia.isoformat(),
+            "creadas": creadas,
+            "completadas": completadas
+        })
+    
+    return {
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "total_creadas": sum(dia["creadas"] for dia in dias),
+        "total_completadas": sum(dia["completadas"] for dia in dias),
+        "dias": dias
+    }
+
 # Montar archivos estáticos del frontend
 frontend_path = Path(__file__).parent.parent / "frontend"
 if frontend_path.exists():
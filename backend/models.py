@@ -1,10 +1,10 @@
 """
 Modelos de base de datos SQLAlchemy para TaskTracker
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from datetime import datetime
 import os
 
@@ -13,13 +13,20 @@ Base = declarative_base()
 
 # Configuración de la base de datos
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "tasks.db")
-DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DATABASE_PATH}")
 
 # Motor de base de datos
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
-# Sesión de base de datos
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sesión de base de datos (sin expirar tras commit: las respuestas no vuelven a consultar la BD)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Siguiente número de la secuencia de cambios (sync delta). Se evalúa dentro de la
+# misma sentencia INSERT/UPDATE, por lo que es atómico bajo el lock de escritura de SQLite.
+NEXT_CHANGE_SEQ = text(
+    "(SELECT COALESCE(MAX(seq), 0) + 1 FROM ("
+    "SELECT MAX(seq) AS seq FROM tasks UNION ALL SELECT MAX(seq) AS seq FROM task_tombstones))"
+)
 
 class Task(Base):
     """
@@ -32,6 +39,27 @@ class Task(Base):
     descripcion = Column(String, nullable=True)
     estado = Column(String, default="pendiente")  # pendiente | completada
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # control de concurrencia optimista
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    seq = Column(Integer, index=True, default=NEXT_CHANGE_SEQ, onupdate=NEXT_CHANGE_SEQ)  # secuencia de cambios
+    fecha_completada = Column(DateTime, nullable=True)  # se fija al pasar a completada, se borra al reabrir
+    lista_id = Column(Integer, nullable=True)  # lista de tareas (solo en las bases de los shards)
+    rank = Column(String, nullable=True)  # clave fraccionaria del orden manual (ver ranking.py)
+    
+    # eager_defaults: obtener seq con RETURNING en el mismo INSERT/UPDATE
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
+    __table_args__ = (
+        # Búsqueda de tareas completadas antiguas para el archivado
+        Index("ix_tasks_estado_fecha_actualizacion", "estado", "fecha_actualizacion"),
+        # Paginación keyset del listado (más recientes primero)
+        Index("ix_tasks_fecha_creacion_id", "fecha_creacion", "id"),
+        # Paginación keyset dentro de una lista (shards)
+        Index("ix_tasks_lista_fecha_creacion_id", "lista_id", "fecha_creacion", "id"),
+        # Orden manual y su paginación keyset
+        Index("ix_tasks_rank_id", "rank", "id"),
+        # IDs monótonos: no reutilizar IDs de tareas archivadas o eliminadas
+        {"sqlite_autoincrement": True},
+    )
     
     def to_dict(self):
         """Serializa la tarea a diccionario JSON"""
@@ -40,12 +68,190 @@ class Task(Base):
             "titulo": self.titulo,
             "descripcion": self.descripcion,
             "estado": self.estado,
-            "fecha_creacion": self.fecha_creacion.isoformat() if self.fecha_creacion else None
+            "fecha_creacion": self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            "version": self.version,
+            "seq": self.seq,
+            "fecha_completada": self.fecha_completada.isoformat() if self.fecha_completada else None,
+            "rank": self.rank
         }
 
-def create_tables():
-    """Inicializa las tablas de la base de datos"""
-    Base.metadata.create_all(bind=engine)
+class ArchivedTask(Base):
+    """
+    Tareas completadas antiguas movidas fuera de la tabla principal (datos fríos)
+    """
+    __tablename__ = "tasks_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # conserva el ID original
+    titulo = Column(String, nullable=False)
+    descripcion = Column(String, nullable=True)
+    estado = Column(String, default="completada")
+    fecha_creacion = Column(DateTime)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    fecha_actualizacion = Column(DateTime)
+    fecha_archivado = Column(DateTime, default=datetime.utcnow)
+    fecha_completada = Column(DateTime, nullable=True)
+    lista_id = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        # Paginación keyset del listado con include_archived
+        Index("ix_tasks_archive_fecha_creacion_id", "fecha_creacion", "id"),
+    )
+
+class TaskTombstone(Base):
+    """
+    Marca de eliminación (o archivado) de una tarea para la sincronización delta
+    """
+    __tablename__ = "task_tombstones"
+    
+    task_id = Column(Integer, primary_key=True, autoincrement=False)
+    seq = Column(Integer, nullable=False, index=True, default=NEXT_CHANGE_SEQ)
+    archivada = Column(Boolean, nullable=False, default=False, server_default="0")
+    fecha = Column(DateTime, default=datetime.utcnow)
+    lista_id = Column(Integer, nullable=True)  # lista de la tarea (solo en las bases de los shards)
+    
+    __table_args__ = (
+        # Sincronización delta de una lista
+        Index("ix_task_tombstones_lista_seq", "lista_id", "seq"),
+    )
+
+class TaskList(Base):
+    """
+    Lista de tareas (proyecto). Sus tareas viven en la base SQLite del shard asignado.
+    """
+    __tablename__ = "task_lists"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nombre = Column(String, nullable=False)
+    descripcion = Column(String, nullable=True)
+    shard = Column(Integer, nullable=False)  # fijo al crear la lista
+    fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class TaskDailyStats(Base):
+    """
+    Resumen diario de tareas creadas y completadas (para gráficos de tendencia).
+    Se mantiene de forma incremental con triggers en cada escritura de tasks.
+    """
+    __tablename__ = "task_stats_daily"
+    
+    fecha = Column(Date, primary_key=True)
+    creadas = Column(Integer, nullable=False, default=0, server_default="0")
+    completadas = Column(Integer, nullable=False, default=0, server_default="0")
+
+# Versión del esquema; incrementar cada vez que cambien tablas, columnas, índices o triggers
+SCHEMA_VERSION = 11
+
+# Rellenos de datos para columnas de tasks agregadas por migración (idempotentes)
+TASK_BACKFILLS = [
+    "UPDATE tasks SET fecha_actualizacion = fecha_creacion WHERE fecha_actualizacion IS NULL",
+    "UPDATE tasks SET seq = id WHERE seq IS NULL",
+    # Para tareas completadas antes de existir la columna, la mejor estimación es su última actualización
+    "UPDATE tasks SET fecha_completada = COALESCE(fecha_actualizacion, fecha_creacion) "
+    "WHERE estado = 'completada' AND fecha_completada IS NULL",
+]
+
+# Rellenos de la base principal (archivo y resumen diario)
+SCHEMA_BACKFILLS = TASK_BACKFILLS + [
+    "UPDATE tasks_archive SET fecha_completada = COALESCE(fecha_actualizacion, fecha_creacion) "
+    "WHERE estado = 'completada' AND fecha_completada IS NULL",
+    # Resumen diario inicial a partir de tareas activas y archivadas (solo si está vacío)
+    "INSERT INTO task_stats_daily (fecha, creadas, completadas) "
+    "SELECT fecha, SUM(creadas), SUM(completadas) FROM ("
+    "SELECT date(fecha_creacion) AS fecha, 1 AS creadas, 0 AS completadas FROM tasks "
+    "UNION ALL SELECT date(fecha_completada), 0, 1 FROM tasks WHERE fecha_completada IS NOT NULL "
+    "UNION ALL SELECT date(fecha_creacion), 1, 0 FROM tasks_archive "
+    "UNION ALL SELECT date(fecha_completada), 0, 1 FROM tasks_archive WHERE fecha_completada IS NOT NULL"
+    ") WHERE fecha IS NOT NULL AND NOT EXISTS (SELECT 1 FROM task_stats_daily) GROUP BY fecha",
+]
+
+# Suma un delta al resumen diario de una fecha (creando la fila si no existe)
+_BUMP_DAILY_STATS = (
+    "INSERT INTO task_stats_daily (fecha, creadas, completadas) SELECT date({fecha}), {creadas}, {completadas} "
+    "WHERE {fecha} IS NOT NULL ON CONFLICT(fecha) DO UPDATE SET "
+    "creadas = creadas + excluded.creadas, completadas = completadas + excluded.completadas;"
+)
+
+# Triggers que mantienen task_stats_daily en cada escritura (ORM, SQL directo o importación).
+# Se crean después de los rellenos para no contar dos veces los datos existentes.
+SCHEMA_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_insert AFTER INSERT ON tasks BEGIN "
+    + _BUMP_DAILY_STATS.format(fecha="NEW.fecha_creacion", creadas=1, completadas=0)
+    + " END",
+    "CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_insert_completed AFTER INSERT ON tasks "
+    "WHEN NEW.fecha_completada IS NOT NULL BEGIN "
+    + _BUMP_DAILY_STATS.format(fecha="NEW.fecha_completada", creadas=0, completadas=1)
+    + " END",
+    "CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_completion AFTER UPDATE OF fecha_completada ON tasks "
+    "WHEN OLD.fecha_completada IS NOT NEW.fecha_completada BEGIN "
+    + _BUMP_DAILY_STATS.format(fecha="OLD.fecha_completada", creadas=0, completadas=-1)
+    + _BUMP_DAILY_STATS.format(fecha="NEW.fecha_completada", creadas=0, completadas=1)
+    + " END",
+]
+
+# Una tarea nueva (creación, importación o ID reutilizado sin AUTOINCREMENT en bases
+# antiguas) anula la marca de eliminación de su ID en la misma transacción, para que
+# /tasks/changes no entregue a la vez la fila viva y su eliminación anterior
+TOMBSTONE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS trg_tasks_clear_tombstone AFTER INSERT ON tasks BEGIN "
+    "DELETE FROM task_tombstones WHERE task_id = NEW.id; END",
+]
+
+# Tablas de la base de un shard: solo tareas y marcas de eliminación (listas, archivo y
+# resumen diario viven en la base principal; las tareas de listas no se archivan)
+SHARD_TABLES = [Task.__table__, TaskTombstone.__table__]
+
+# Shards creados con el esquema completo: quitar los triggers del resumen diario
+SHARD_CLEANUP = [
+    "DROP TRIGGER IF EXISTS trg_tasks_stats_insert",
+    "DROP TRIGGER IF EXISTS trg_tasks_stats_insert_completed",
+    "DROP TRIGGER IF EXISTS trg_tasks_stats_completion",
+]
+
+def _add_missing_columns(conn, tables):
+    """
+    Migración ligera: agrega a las tablas existentes las columnas e índices
+    declarados en los modelos que aún no existen en la base de datos
+    """
+    inspector = inspect(conn)
+    for table in tables:
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                default = getattr(default, "text", None) or f"'{default}'"
+                ddl += f" DEFAULT {default}"
+            conn.exec_driver_sql(ddl)
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def _apply_schema(bind, force: bool, tables, statements) -> bool:
+    """Crea y migra 'tables' y ejecuta 'statements' si la versión guardada cambió"""
+    with bind.begin() as conn:
+        current_version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if current_version == SCHEMA_VERSION and not force:
+            return False
+        Base.metadata.create_all(bind=conn, tables=tables)
+        _add_missing_columns(conn, tables)
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return True
+
+def create_tables(force: bool = False, bind=None) -> bool:
+    """
+    Inicializa las tablas de la base de datos principal.
+    Omite la verificación del esquema si la versión guardada no cambió.
+    Devuelve True si se aplicaron cambios de esquema.
+    """
+    return _apply_schema(bind or engine, force, Base.metadata.sorted_tables, SCHEMA_BACKFILLS + SCHEMA_TRIGGERS + TOMBSTONE_TRIGGERS)
+
+def create_shard_tables(bind, force: bool = False) -> bool:
+    """Inicializa la base de un shard (solo SHARD_TABLES), igual que create_tables"""
+    return _apply_schema(bind, force, SHARD_TABLES, TASK_BACKFILLS + SHARD_CLEANUP + TOMBSTONE_TRIGGERS)
 
 def get_db():
     """Genera sesiones de base de datos SQLAlchemy"""
@@ -0,0 +1,272 @@
+"""
+Orden manual de tareas con claves de rango fraccionarias (lexicográficas).
+
+Cada tarea tiene una clave 'rank' en base 62; el orden manual es el orden de
+las claves como texto. Mover una tarea solo reescribe su clave con una nueva
+que queda entre las de sus vecinas, sin renumerar la lista. Las claves tienen
+una parte entera de longitud variable (como en fractional-indexing), así que
+agregar siempre al inicio o al final mantiene claves cortas; insertar muchas
+veces en el mismo hueco sí las alarga, y un rebalanceo periódico las reescribe.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update, func, bindparam
+from starlette.concurrency import run_in_threadpool
+
+from models import Task, engine
+from config import settings
+
+# Dígitos en orden ASCII (coincide con la comparación de texto de SQLite)
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+INTEGER_ZERO = "a0"
+SMALLEST_INTEGER = "A" + "0" * 26
+
+def _integer_length(head: str) -> int:
+    """Longitud de la parte entera según su primer carácter (a-z positivos, A-Z negativos)"""
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Clave de rango inválida: {head!r}")
+
+def _integer_part(key: str) -> str:
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Clave de rango inválida: {key!r}")
+    return key[:length]
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    """Fracción estrictamente entre a y b (b=None: sin límite superior), sin ceros finales"""
+    if b is not None:
+        # Copiar el prefijo común
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    # Dígitos consecutivos
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+def _increment_integer(x: str) -> Optional[str]:
+    head, digits = x[0], list(x[1:])
+    for i in range(len(digits) - 1, -1, -1):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = DIGITS[0]
+    # Acarreo: cambia la longitud de la parte entera
+    if head == "Z":
+        return INTEGER_ZERO
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+def _decrement_integer(x: str) -> Optional[str]:
+    head, digits = x[0], list(x[1:])
+    for i in range(len(digits) - 1, -1, -1):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+def key_between(a: Optional[str], b: Optional[str]) -> str:
+    """
+    Clave estrictamente entre a y b (None = sin límite de ese lado).
+    ValueError si a >= b (p. ej. claves duplicadas que requieren rebalanceo).
+    """
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"Claves fuera de orden: {a!r} >= {b!r}")
+    if a is None and b is None:
+        return INTEGER_ZERO
+    if a is None:
+        integer = _integer_part(b)
+        fraction = b[len(integer):]
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint("", fraction)
+        if integer < b:
+            return integer
+        result = _decrement_integer(integer)
+        if result is None:
+            raise ValueError("No hay claves de rango menores disponibles")
+        return result
+    integer = _integer_part(a)
+    fraction = a[len(integer):]
+    if b is None:
+        result = _increment_integer(integer)
+        return result if result is not None else integer + _midpoint(fraction, None)
+    if integer == _integer_part(b):
+        return integer + _midpoint(fraction, b[len(integer):])
+    result = _increment_integer(integer)
+    if result is not None and result < b:
+        return result
+    return integer + _midpoint(fraction, None)
+
+def keys_after(a: Optional[str], count: int) -> List[str]:
+    """'count' claves consecutivas y cortas después de a (enteros sucesivos)"""
+    keys = []
+    key = a
+    for _ in range(count):
+        key = key_between(key, None)
+        keys.append(key)
+    return keys
+
+def top_rank(session) -> str:
+    """Clave para una tarea nueva: antes de todas (aparece primera en el orden manual)"""
+    first = session.execute(select(func.min(Task.rank))).scalar()
+    return key_between(None, first)
+
+def fill_missing_ranks(conn, limit: Optional[int] = None) -> int:
+    """
+    Asigna claves a las tareas sin rango (creadas antes de esta columna o por
+    rutas que no lo asignan), al final y en el orden de fecha de creación actual.
+    Con 'limit', solo a las primeras 'limit' (las siguientes quedan después).
+    """
+    stmt = select(Task.id).where(Task.rank.is_(None)).order_by(Task.fecha_creacion.desc(), Task.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    ids = conn.execute(stmt).scalars().all()
+    if ids:
+        last = conn.execute(select(func.max(Task.rank))).scalar()
+        _write_ranks(conn, ids, keys_after(last, len(ids)))
+    return len(ids)
+
+def fill_missing_ranks_batch(bind, batch_size: int) -> int:
+    """Un lote de fill_missing_ranks en su propia transacción"""
+    with bind.begin() as conn:
+        return fill_missing_ranks(conn, batch_size)
+
+async def assign_missing_ranks(bind=None, batch_size: int = None) -> int:
+    """
+    Completa los rangos faltantes en lotes acotados y transacciones separadas (como
+    el rebalanceo), para no bloquear el arranque ni retener el lock de escritura
+    """
+    bind = bind or engine
+    batch_size = batch_size or settings.RANK_REBALANCE_BATCH_SIZE
+    total = 0
+    while True:
+        filled = await run_in_threadpool(fill_missing_ranks_batch, bind, batch_size)
+        total += filled
+        if filled < batch_size:
+            break
+        await asyncio.sleep(0.05)
+    return total
+
+def _write_ranks(conn, ids: List[int], keys: List[str]):
+    """
+    Reescribe claves sin tocar version ni fecha_actualizacion (no es un cambio del usuario).
+    seq sí avanza para que la sincronización delta entregue el nuevo orden.
+    """
+    conn.execute(
+        update(Task)
+        .where(Task.id == bindparam("task_id"))
+        .values(rank=bindparam("new_rank"), fecha_actualizacion=Task.fecha_actualizacion),
+        [{"task_id": task_id, "new_rank": key} for task_id, key in zip(ids, keys)]
+    )
+
+def _key_below(key: str, floor: str) -> str:
+    """Clave corta justo debajo de 'key' y por encima de 'floor' (entero anterior si cabe)"""
+    if len(key) == _integer_length(key[0]):
+        previous = _decrement_integer(key)
+        if previous is not None and previous > floor:
+            return previous
+    return key_between(floor, key)
+
+def rebalance_batch(bind, floor: str, lowest: str, batch_size: int) -> Tuple[int, str]:
+    """
+    Reescribe un lote de claves en su propia transacción: las 'batch_size' tareas
+    más altas con clave <= floor reciben claves nuevas decrecientes justo debajo
+    de 'lowest' (la menor clave nueva asignada hasta ahora).
+    Devuelve las tareas reescritas y la nueva menor clave.
+    """
+    with bind.begin() as conn:
+        ids = conn.execute(
+            select(Task.id).where(Task.rank <= floor)
+            .order_by(Task.rank.desc(), Task.id.desc()).limit(batch_size)
+        ).scalars().all()
+        keys = []
+        for _ in ids:
+            lowest = _key_below(lowest, floor)
+            keys.append(lowest)
+        if ids:
+            _write_ranks(conn, ids, keys)
+    return len(ids), lowest
+
+async def rebalance_ranks(bind=None, batch_size: int = None) -> int:
+    """
+    Reasigna claves cortas conservando el orden, en lotes acotados y transacciones
+    separadas (como el archivado) para no retener el lock de escritura de toda la tabla.
+
+    Se recorre el orden desde el final: las claves nuevas son enteros consecutivos por
+    encima de la mayor clave al empezar ('floor'), así que cada lote reescrito queda
+    después de las tareas pendientes y el orden es consistente entre lotes. Las tareas
+    movidas o creadas entre lotes conservan su posición por su propia clave.
+    """
+    bind = bind or engine
+    batch_size = batch_size or settings.RANK_REBALANCE_BATCH_SIZE
+    with bind.connect() as conn:
+        floor = conn.execute(select(func.max(Task.rank))).scalar()
+        count = conn.execute(select(func.count()).where(Task.rank.is_not(None))).scalar()
+    if floor is None:
+        return 0
+    # Una clave por encima de la última que se asignará (se asignan hacia abajo)
+    lowest = keys_after(floor, count + 1)[-1]
+
+    total = 0
+    while True:
+        rewritten, lowest = await run_in_threadpool(rebalance_batch, bind, floor, lowest, batch_size)
+        total += rewritten
+        if rewritten < batch_size:
+            break
+        # Pausa breve entre lotes para dejar pasar otras escrituras
+        await asyncio.sleep(0.05)
+    return total
+
+def needs_rebalance(bind=None) -> bool:
+    """Alguna clave supera RANK_MAX_LENGTH"""
+    with (bind or engine).connect() as conn:
+        longest = conn.execute(select(func.max(func.length(Task.rank)))).scalar() or 0
+    return longest > settings.RANK_MAX_LENGTH
+
+async def rank_rebalance_loop():
+    """
+    Tarea en segundo plano: completa rangos faltantes y rebalancea claves largas
+    en la base principal y en los shards abiertos
+    """
+    from shards import shard_router
+
+    while True:
+        try:
+            for bind in [engine] + list(shard_router.engines.values()):
+                await assign_missing_ranks(bind)
+                if await run_in_threadpool(needs_rebalance, bind):
+                    rebalanced = await rebalance_ranks(bind)
+                    print(f"[Ranking] Claves de orden rebalanceadas ({rebalanced} tareas)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Ranking] Error rebalanceando el orden: {e}")
+        await asyncio.sleep(settings.RANK_REBALANCE_INTERVAL_SECONDS)
@@ -1,13 +1,25 @@
 """
 Endpoints API para operaciones CRUD de tareas
 """
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, insert, update, delete, literal, tuple_, case, func, union_all
 from sqlalchemy.orm import Session
-from typing import List
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
+import codecs
+import csv
+import io
+import json
 
-from models import Task, get_db
+from models import Task, ArchivedTask, TaskTombstone, get_db, SessionLocal, engine
+from write_queue import execute_write
+from task_cache import task_cache
+from journal_store import task_store, VersionConflict
+from ranking import top_rank, key_between, keys_after
+from config import settings
 
 # Router para las rutas de tareas
 router = APIRouter()
@@ -17,6 +29,11 @@ class TaskCreate(BaseModel):
     titulo: str
     descripcion: str = ""
 
+class TaskImport(TaskCreate):
+    estado: str = "pendiente"
+    fecha_creacion: Optional[datetime] = None
+    fecha_completada: Optional[datetime] = None
+
 class TaskUpdate(BaseModel):
     titulo: str = None
     descripcion: str = None
@@ -28,6 +45,12 @@ class TaskResponse(BaseModel):
     descripcion: str
     estado: str
     fecha_creacion: datetime
+    version: int
+    seq: Optional[int] = None
+    fecha_completada: Optional[datetime] = None
+    lista_id: Optional[int] = None
+    rank: Optional[str] = None
+    archivada: bool = False
     
     class Config:
         from_attributes = True
@@ -37,18 +60,24 @@ async def crear_tarea(task: TaskCreate, db: Session = Depends(get_db)):
     """
     Crea una nueva tarea en el sistema
     """
-    try:
+    def operation(session: Session):
         # Crear nueva tarea
         db_task = Task(
             titulo=task.titulo,
             descripcion=task.descripcion,
-            estado="pendiente"
+            estado="pendiente",
+            rank=top_rank(session)
         )
-        db.add(db_task)
-        db.commit()
-        db.refresh(db_task)
-        
+        session.add(db_task)
+        session.flush()
         return db_task
+    
+    try:
+        if task_store is not None:
+            return task_store.create(task.titulo, task.descripcion)
+        created = TaskResponse.model_validate(await execute_write(operation, db))
+        task_cache.task_created(created)
+        return created
         
     except Exception as e:
         db.rollback()
@@ -57,33 +86,597 @@ async def crear_tarea(task: TaskCreate, db: Session = Depends(get_db)):
             detail="Error al crear la tarea"
         )
 
+# Columnas de respuesta comunes a tareas activas y archivadas
+RESPONSE_COLUMNS = ["id", "titulo", "descripcion", "estado", "fecha_creacion", "version", "fecha_completada"]
+
+def _archived_tasks_select():
+    """Selecciona las tareas archivadas con la misma forma que TaskResponse"""
+    return select(
+        *[ArchivedTask.__table__.c[name] for name in RESPONSE_COLUMNS],
+        literal(True).label("archivada")
+    )
+
+def _with_archived_select(estado: Optional[str], position, limit: Optional[int]):
+    """
+    Tareas activas y archivadas de la más reciente a la más antigua, keyset opcional.
+    El filtro y el cursor se aplican en cada tabla (por su índice (fecha_creacion, id)),
+    y cada una aporta como mucho 'limit' filas antes de combinarlas.
+    """
+    branches = []
+    for model, archivada in ((Task, False), (ArchivedTask, True)):
+        branch = select(
+            *[model.__table__.c[name] for name in RESPONSE_COLUMNS],
+            literal(archivada).label("archivada")
+        )
+        if estado is not None:
+            branch = branch.where(model.estado == estado)
+        if position is not None:
+            branch = branch.where(tuple_(model.fecha_creacion, model.id) < position)
+        if limit is not None:
+            branch = select(
+                branch.order_by(model.fecha_creacion.desc(), model.id.desc()).limit(limit).subquery()
+            )
+        branches.append(branch)
+    return union_all(*branches).subquery()
+
+# Campos seleccionables con ?fields= en el listado (columnas de tasks)
+FIELD_COLUMNS = ["id", "titulo", "descripcion", "estado", "fecha_creacion", "version", "seq", "fecha_completada", "rank"]
+
+# Órdenes del listado: columnas de la clave keyset y dirección
+SORT_KEYS = {"fecha": ("fecha_creacion", "id"), "rank": ("rank", "id")}
+
+def _parse_fields(fields: Optional[str], allowed: List[str]) -> Optional[List[str]]:
+    """
+    Campos pedidos en ?fields=id,titulo,estado (en el orden de 'allowed').
+    None si no se pidió una proyección.
+    """
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(allowed)
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos no válidos: {', '.join(sorted(unknown)) or '(vacío)'}. Disponibles: {', '.join(allowed)}"
+        )
+    return [name for name in allowed if name in requested]
+
+def _plain_value(value):
+    """Valor serializable a JSON (fechas en ISO 8601, igual que TaskResponse)"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _project(row, fields: List[str]) -> dict:
+    """Proyecta una fila plana (o registro) a un dict con solo los campos pedidos"""
+    return {name: _plain_value(getattr(row, name)) for name in fields}
+
+def _parse_sort(sort: str) -> str:
+    """Valida el orden del listado: 'fecha' (más recientes primero) o 'rank' (orden manual)"""
+    if sort not in SORT_KEYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Orden debe ser 'fecha' o 'rank'"
+        )
+    return sort
+
+def _encode_cursor(task, sort: str = "fecha") -> str:
+    """Cursor de paginación keyset: posición (fecha_creacion, id) o (rank, id) de la última fila"""
+    if sort == "rank":
+        return f"{task.rank}|{task.id}"
+    return f"{task.fecha_creacion.isoformat()}|{task.id}"
+
+def _decode_cursor(cursor: str, sort: str = "fecha"):
+    """Convierte el cursor en la tupla (fecha_creacion, id) o (rank, id)"""
+    try:
+        key, task_id = cursor.rsplit("|", 1)
+        return (key if sort == "rank" else datetime.fromisoformat(key)), int(task_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+
+def _task_list_select(names: List[str], estado: Optional[str], position, limit: Optional[int], sort: str = "fecha"):
+    """
+    SELECT de columnas de tasks para el listado, keyset opcional:
+    'fecha' de la más reciente a la más antigua, 'rank' en el orden manual
+    """
+    stmt = select(*[Task.__table__.c[name] for name in names])
+    if estado is not None:
+        stmt = stmt.where(Task.estado == estado)
+    if sort == "rank":
+        if position is not None:
+            stmt = stmt.where(tuple_(Task.rank, Task.id) > position)
+        stmt = stmt.order_by(Task.rank, Task.id)
+    else:
+        if position is not None:
+            stmt = stmt.where(tuple_(Task.fecha_creacion, Task.id) < position)
+        stmt = stmt.order_by(Task.fecha_creacion.desc(), Task.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
 @router.get("/tasks", response_model=List[TaskResponse])
-async def listar_tareas(db: Session = Depends(get_db)):
+async def listar_tareas(
+    response: Response,
+    include_archived: bool = False,
+    estado: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: str = "fecha",
+    db: Session = Depends(get_db)
+):
     """
-    Obtiene la lista completa de tareas
+    Obtiene la lista de tareas, de la más reciente a la más antigua
+    (con sort=rank, en el orden manual definido con /tasks/{id}/move).
+    Con 'limit' pagina por keyset: el cursor de la página siguiente
+    se devuelve en la cabecera X-Next-Cursor.
+    Con 'fields' (p. ej. fields=id,titulo,estado) solo se leen y devuelven esas columnas.
     """
+    if estado is not None and estado not in ["pendiente", "completada"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Estado debe ser 'pendiente' o 'completada'"
+        )
+    if limit is not None:
+        limit = max(1, min(limit, 1000))
+    sort = _parse_sort(sort)
+    if sort == "rank" and (task_store is not None or include_archived):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El orden manual no está disponible con el motor journal ni con include_archived"
+        )
+    position = _decode_cursor(cursor, sort) if cursor else None
+    selected = _parse_fields(fields, RESPONSE_COLUMNS + ["archivada"] if include_archived else FIELD_COLUMNS)
+    
     try:
-        tasks = db.query(Task).order_by(Task.fecha_creacion.desc()).all()
+        if task_store is not None:
+            # Motor journal: índices en memoria (sin archivo ni caché)
+            tasks = task_store.list(estado, limit, position)
+        elif include_archived:
+            combined = _with_archived_select(estado, position, limit)
+            names = RESPONSE_COLUMNS + ["archivada"] if selected is None else (
+                selected + [name for name in SORT_KEYS[sort] if limit is not None and name not in selected]
+            )
+            stmt = (
+                select(*[combined.c[name] for name in names])
+                .order_by(combined.c.fecha_creacion.desc(), combined.c.id.desc())
+            )
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            tasks = db.execute(stmt).all()
+        elif selected is not None:
+            # Proyección: filas planas con solo las columnas pedidas (más las del cursor), sin caché
+            names = selected + [name for name in SORT_KEYS[sort] if limit is not None and name not in selected]
+            tasks = db.execute(_task_list_select(names, estado, position, limit, sort)).all()
+        else:
+            # Solo se cachean listados completos o primeras páginas por fecha
+            # (la caché actualiza filas en su lugar y no reordena por rank)
+            cache_key = ("tasks", estado, limit)
+            cacheable = position is None and sort == "fecha"
+            tasks = task_cache.get_list(cache_key) if cacheable else None
+            if tasks is None:
+                # Filas planas en lugar de entidades ORM (sin identity map)
+                rows = db.execute(_task_list_select(FIELD_COLUMNS, estado, position, limit, sort)).all()
+                tasks = [TaskResponse.model_validate(row) for row in rows]
+                if cacheable:
+                    task_cache.put_list(cache_key, tasks, estado=estado, limit=limit)
+        
+        headers = {}
+        if limit is not None and len(tasks) == limit:
+            headers["X-Next-Cursor"] = _encode_cursor(tasks[-1], sort)
+        if selected is not None:
+            return JSONResponse([_project(task, selected) for task in tasks], headers=headers)
+        response.headers.update(headers)
         return tasks
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al obtener las tareas"
         )
 
+class TaskDeleted(BaseModel):
+    id: int
+    seq: int
+    archivada: bool = False
+
+class TaskChanges(BaseModel):
+    changes: List[TaskResponse]
+    deleted: List[TaskDeleted]
+    next_since: int
+    has_more: bool
+
+def _changes_since(session: Session, since: int, limit: int, lista_id: Optional[int] = None) -> dict:
+    """
+    Cambios después de la secuencia 'since' en una base SQLite (recorrido por
+    rango sobre índices de seq); con 'lista_id', solo los de esa lista
+    """
+    def changed_tasks(upper: Optional[int], max_rows: Optional[int]):
+        stmt = select(*Task.__table__.c).where(Task.seq > since).order_by(Task.seq)
+        if lista_id is not None:
+            stmt = stmt.where(Task.lista_id == lista_id)
+        if upper is not None:
+            stmt = stmt.where(Task.seq <= upper)
+        if max_rows is not None:
+            stmt = stmt.limit(max_rows)
+        return session.execute(stmt).all()
+
+    def tombstones(upper: Optional[int], max_rows: Optional[int]):
+        stmt = (
+            select(TaskTombstone.task_id.label("id"), TaskTombstone.seq, TaskTombstone.archivada)
+            .where(TaskTombstone.seq > since)
+            .order_by(TaskTombstone.seq)
+        )
+        if lista_id is not None:
+            stmt = stmt.where(TaskTombstone.lista_id == lista_id)
+        if upper is not None:
+            stmt = stmt.where(TaskTombstone.seq <= upper)
+        if max_rows is not None:
+            stmt = stmt.limit(max_rows)
+        return session.execute(stmt).all()
+
+    changed = changed_tasks(None, limit + 1)
+    deleted = tombstones(None, limit + 1)
+    has_more = len(changed) + len(deleted) > limit
+    if has_more:
+        # Cortar en una secuencia completa para no partir cambios con el mismo seq
+        upper = sorted(row.seq for row in changed + deleted)[limit - 1]
+        changed = changed_tasks(upper, None)
+        deleted = tombstones(upper, None)
+    return _changes_response(changed, deleted, since, has_more)
+
+def _changes_response(changed, deleted, since: int, has_more: bool) -> dict:
+    seqs = [row.seq for row in changed] + [row.seq for row in deleted]
+    return {
+        "changes": changed,
+        "deleted": deleted,
+        "next_since": max(seqs) if seqs else since,
+        "has_more": has_more
+    }
+
+@router.get("/tasks/changes", response_model=TaskChanges)
+async def cambios_tareas(since: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
+    """
+    Sincronización delta: tareas creadas, actualizadas o eliminadas
+    después de la secuencia 'since' (recorrido por rango sobre índices de seq)
+    """
+    limit = max(1, min(limit, 10000))
+    try:
+        if task_store is not None:
+            # Motor journal: cada cambio tiene un seq único
+            changed, deleted, has_more = task_store.changes_since(since, limit)
+            return _changes_response(changed, deleted, since, has_more)
+        return _changes_since(db, since, limit)
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al obtener los cambios"
+        )
+
+# Columnas exportadas (en orden) por /tasks/export
+EXPORT_COLUMNS = ["id", "titulo", "descripcion", "estado", "fecha_creacion", "fecha_completada"]
+
+def _iter_task_rows(chunk_size: int, columns: List[str], include_archived: bool = True):
+    """
+    Recorre la tabla de tareas (y luego la de archivadas) por lotes usando un cursor en streaming.
+    Devuelve filas planas (no entidades ORM) con solo 'columns' para mantener la memoria constante.
+    """
+    if task_store is not None:
+        yield from task_store.iter_chunks(chunk_size)
+        return
+    models = [Task, ArchivedTask] if include_archived else [Task]
+    db = SessionLocal()
+    try:
+        for model in models:
+            stmt = (
+                select(*[model.__table__.c[name] for name in columns])
+                .order_by(model.id)
+                .execution_options(yield_per=chunk_size)
+            )
+            for partition in db.execute(stmt).partitions():
+                yield partition
+    finally:
+        db.close()
+
+def _export_ndjson(chunk_size: int, columns: List[str], include_archived: bool):
+    """Genera la exportación en formato NDJSON (una tarea JSON por línea)"""
+    for rows in _iter_task_rows(chunk_size, columns, include_archived):
+        yield "".join(
+            json.dumps(_project(row, columns), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+def _export_csv(chunk_size: int, columns: List[str], include_archived: bool):
+    """Genera la exportación en formato CSV con cabecera"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    
+    for rows in _iter_task_rows(chunk_size, columns, include_archived):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            tuple(
+                "" if value is None else _plain_value(value)
+                for value in (getattr(row, name) for name in columns)
+            )
+            for row in rows
+        )
+        yield buffer.getvalue()
+
+@router.get("/tasks/export")
+async def exportar_tareas(format: str = "ndjson", fields: Optional[str] = None, include_archived: bool = True):
+    """
+    Exporta todas las tareas en streaming (NDJSON o CSV) con memoria constante.
+    Incluye las archivadas (después de las activas) salvo con include_archived=false.
+    Con 'fields' solo se leen y exportan esas columnas.
+    """
+    columns = _parse_fields(fields, EXPORT_COLUMNS) or EXPORT_COLUMNS
+    if format == "ndjson":
+        generator, media_type = _export_ndjson, "application/x-ndjson"
+    elif format == "csv":
+        generator, media_type = _export_csv, "text/csv"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato debe ser 'ndjson' o 'csv'"
+        )
+    
+    return StreamingResponse(
+        generator(settings.EXPORT_CHUNK_SIZE, columns, include_archived),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="tasks.{format}"',
+            "Cache-Control": "no-cache"
+        }
+    )
+
+async def _iter_request_lines(request: Request):
+    """
+    Lee el cuerpo de la petición de forma incremental y lo divide en líneas
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+async def _iter_ndjson_records(request: Request):
+    """Genera (número de línea, dict) para cada línea NDJSON no vacía"""
+    line_number = 0
+    async for line in _iter_request_lines(request):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("se esperaba un objeto JSON")
+        except ValueError as e:
+            yield line_number, None, f"JSON inválido: {e}"
+            continue
+        yield line_number, record, None
+
+async def _iter_csv_records(request: Request):
+    """
+    Genera (número de línea, dict) para cada registro CSV.
+    Un registro puede ocupar varias líneas si tiene campos entre comillas.
+    """
+    header = None
+    line_number = 0
+    record_start = 0
+    record_lines = []
+    async for line in _iter_request_lines(request):
+        line_number += 1
+        if not record_lines:
+            record_start = line_number
+        record_lines.append(line)
+        # Con un número impar de comillas el campo entre comillas continúa
+        if sum(part.count('"') for part in record_lines) % 2:
+            continue
+        
+        record_text = "\n".join(record_lines)
+        record_lines = []
+        if not record_text.strip():
+            continue
+        values = next(csv.reader([record_text]))
+        if header is None:
+            header = values
+            continue
+        if len(values) != len(header):
+            yield record_start, None, f"Se esperaban {len(header)} columnas y se recibieron {len(values)}"
+            continue
+        yield record_start, {k: v for k, v in zip(header, values) if v != "" or k == "descripcion"}, None
+    
+    if record_lines:
+        yield record_start, None, "Campo entre comillas sin cerrar al final del archivo"
+
+def _insert_chunk(rows: List[dict]):
+    """Inserta un lote de tareas con executemany dentro de una sola transacción"""
+    if task_store is not None:
+        # Motor journal: una sola escritura al journal por lote
+        task_store.create_many(rows)
+        return
+    with engine.begin() as conn:
+        # Las tareas importadas van al final del orden manual, en el orden del archivo
+        last = conn.execute(select(func.max(Task.rank))).scalar()
+        for row, rank in zip(rows, keys_after(last, len(rows))):
+            row["rank"] = rank
+        conn.execute(Task.__table__.insert(), rows)
+
+@router.post("/tasks/import")
+async def importar_tareas(request: Request, format: str = "ndjson", chunk_size: int = None):
+    """
+    Importa tareas desde un cuerpo NDJSON o CSV en streaming.
+    Inserta por lotes en transacciones acotadas y reporta errores por línea.
+    """
+    if format == "ndjson":
+        records = _iter_ndjson_records(request)
+    elif format == "csv":
+        records = _iter_csv_records(request)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato debe ser 'ndjson' o 'csv'"
+        )
+    chunk_size = chunk_size if chunk_size and chunk_size > 0 else settings.IMPORT_CHUNK_SIZE
+    
+    importadas = 0
+    total_errores = 0
+    errores = []
+    chunk = []
+    
+    def registrar_error(linea: int, mensaje: str):
+        nonlocal total_errores
+        total_errores += 1
+        if len(errores) < settings.IMPORT_MAX_ERRORS:
+            errores.append({"linea": linea, "error": mensaje})
+    
+    try:
+        async for line_number, record, error in records:
+            if error:
+                registrar_error(line_number, error)
+                continue
+            try:
+                task = TaskImport.model_validate(record)
+            except ValidationError as e:
+                registrar_error(line_number, "; ".join(
+                    f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+            if task.estado not in ["pendiente", "completada"]:
+                registrar_error(line_number, "Estado debe ser 'pendiente' o 'completada'")
+                continue
+            
+            fecha_creacion = task.fecha_creacion or datetime.utcnow()
+            chunk.append({
+                "titulo": task.titulo,
+                "descripcion": task.descripcion,
+                "estado": task.estado,
+                "fecha_creacion": fecha_creacion,
+                # Sin fecha de completado conocida se usa la de creación
+                "fecha_completada": (task.fecha_completada or fecha_creacion) if task.estado == "completada" else None
+            })
+            
+            if len(chunk) >= chunk_size:
+                await run_in_threadpool(_insert_chunk, chunk)
+                importadas += len(chunk)
+                chunk = []
+        
+        if chunk:
+            await run_in_threadpool(_insert_chunk, chunk)
+            importadas += len(chunk)
+            
+    except UnicodeDecodeError:
+        task_cache.clear()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El archivo debe estar codificado en UTF-8 ({importadas} tareas ya importadas)"
+        )
+    except Exception as e:
+        task_cache.clear()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al importar las tareas ({importadas} tareas ya importadas)"
+        )
+    
+    task_cache.clear()
+    return {
+        "importadas": importadas,
+        "total_errores": total_errores,
+        "errores": errores
+    }
+
+def _parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Convierte la cabecera If-Match ("3", W/"3" o *) en el número de versión esperado
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match debe contener la versión de la tarea"
+        )
+
+def _etag(version: int) -> str:
+    """ETag de una tarea a partir de su versión"""
+    return f'"{version}"'
+
+def _conflict_error(task_id: int, current_version: Optional[int], expected_version: Optional[int]) -> HTTPException:
+    """Error de una escritura condicional: 404 si la tarea no existe, 412 si cambió su versión"""
+    if current_version is None:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tarea con ID {task_id} no encontrada"
+        )
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail=f"La tarea fue modificada (versión actual {current_version}, esperada {expected_version})",
+        headers={"ETag": _etag(current_version)}
+    )
+
+def _raise_write_conflict(db: Session, task_id: int, expected_version: Optional[int]):
+    """
+    Determina por qué una escritura condicional no afectó filas: 404 o 412
+    """
+    current_version = db.execute(select(Task.version).where(Task.id == task_id)).scalar()
+    raise _conflict_error(task_id, current_version, expected_version)
+
+def _journal_write(write, task_id: int, expected_version: Optional[int] = None):
+    """Ejecuta una escritura del motor journal traduciendo 'no existe' y VersionConflict a 404/412"""
+    try:
+        result = write()
+    except VersionConflict as e:
+        raise _conflict_error(task_id, e.current_version, expected_version)
+    if result is None:
+        raise _conflict_error(task_id, None, expected_version)
+    return result
+
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
-async def obtener_tarea(task_id: int, db: Session = Depends(get_db)):
+async def obtener_tarea(
+    task_id: int,
+    response: Response,
+    include_archived: bool = False,
+    db: Session = Depends(get_db)
+):
     """
-    Busca una tarea específica por su ID
+    Busca una tarea específica por su ID (también en el archivo si se solicita)
     """
     try:
-        task = db.query(Task).filter(Task.id == task_id).first()
+        if task_store is not None:
+            task = task_store.get(task_id)
+        else:
+            task = task_cache.get(task_id)
+            if task is None:
+                task = db.execute(select(*Task.__table__.c).where(Task.id == task_id)).first()
+                if task:
+                    task = TaskResponse.model_validate(task)
+                    task_cache.store(task)
+        if not task and include_archived and task_store is None:
+            task = db.execute(_archived_tasks_select().where(ArchivedTask.id == task_id)).first()
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Tarea con ID {task_id} no encontrada"
             )
+        response.headers["ETag"] = _etag(task.version)
         return task
         
     except HTTPException:
@@ -99,35 +692,41 @@ async def actualizar_tarea(task_id: int, task_update: TaskUpdate, db: Session =
     """
     Actualizar una tarea existente
     """
-    try:
+    if task_update.estado is not None and task_update.estado not in ["pendiente", "completada"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Estado debe ser 'pendiente' o 'completada'"
+        )
+    if task_store is not None:
+        values = task_update.model_dump(exclude_none=True)
+        return _journal_write(lambda: task_store.update(task_id, values), task_id)
+    
+    def operation(session: Session):
         # Buscar tarea
-        task = db.query(Task).filter(Task.id == task_id).first()
+        task = session.query(Task).filter(Task.id == task_id).populate_existing().first()
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Tarea con ID {task_id} no encontrada"
             )
         
-        # Guardar estado anterior para el log
-        estado_anterior = task.estado
-        
         # Actualizar campos si se proporcionan
         if task_update.titulo is not None:
             task.titulo = task_update.titulo
         if task_update.descripcion is not None:
             task.descripcion = task_update.descripcion
-        if task_update.estado is not None:
-            if task_update.estado not in ["pendiente", "completada"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Estado debe ser 'pendiente' o 'completada'"
-                )
+        if task_update.estado is not None and task_update.estado != task.estado:
             task.estado = task_update.estado
-            
-        db.commit()
-        db.refresh(task)
+            # El trigger de la BD refleja el cambio en el resumen diario
+            task.fecha_completada = datetime.utcnow() if task.estado == "completada" else None
         
+        session.flush()
         return task
+    
+    try:
+        updated = TaskResponse.model_validate(await execute_write(operation, db))
+        task_cache.put(updated)
+        return updated
         
     except HTTPException:
         raise
@@ -138,27 +737,226 @@ async def actualizar_tarea(task_id: int, task_update: TaskUpdate, db: Session =
             detail="Error al actualizar la tarea"
         )
 
-@router.delete("/tasks/{task_id}")
-async def eliminar_tarea(task_id: int, db: Session = Depends(get_db)):
+def _patch_values(task_update: TaskUpdate) -> dict:
+    """Campos enviados en un PATCH (400 si no hay ninguno o el estado no es válido)"""
+    values = task_update.model_dump(exclude_none=True)
+    if not values:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No se proporcionaron campos para actualizar"
+        )
+    if "estado" in values and values["estado"] not in ["pendiente", "completada"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Estado debe ser 'pendiente' o 'completada'"
+        )
+    return values
+
+def _with_completion_date(values: dict) -> dict:
+    """Agrega fecha_completada al UPDATE cuando el PATCH cambia el estado"""
+    if values.get("estado") == "completada":
+        # Conservar la fecha si ya estaba completada (SET evalúa sobre la fila anterior)
+        return {**values, "fecha_completada": case(
+            (Task.estado == "completada", Task.fecha_completada),
+            else_=datetime.utcnow()
+        )}
+    if values.get("estado") == "pendiente":
+        return {**values, "fecha_completada": None}
+    return values
+
+@router.patch("/tasks/{task_id}", response_model=TaskResponse)
+async def modificar_tarea(
+    task_id: int,
+    task_update: TaskUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """
-    Elimina una tarea del sistema permanentemente
+    Actualiza parcialmente una tarea con una sola sentencia UPDATE ... RETURNING.
+    Si se envía If-Match, solo se aplica cuando la versión coincide (si no, 412).
     """
+    expected_version = _parse_if_match(if_match)
+    values = _patch_values(task_update)
+    
+    if task_store is not None:
+        updated = _journal_write(lambda: task_store.update(task_id, values, expected_version), task_id, expected_version)
+        response.headers["ETag"] = _etag(updated.version)
+        return updated
+    
+    values = _with_completion_date(values)
+    
+    def operation(session: Session):
+        stmt = update(Task).where(Task.id == task_id)
+        if expected_version is not None:
+            stmt = stmt.where(Task.version == expected_version)
+        stmt = stmt.values(**values, version=Task.version + 1).returning(*Task.__table__.c)
+        
+        row = session.execute(stmt).first()
+        if row is None:
+            _raise_write_conflict(session, task_id, expected_version)
+        return row
+    
     try:
-        # Buscar tarea
-        task = db.query(Task).filter(Task.id == task_id).first()
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Tarea con ID {task_id} no encontrada"
-            )
-            
-        # Guardar título para el log
-        titulo_tarea = task.titulo
+        updated = TaskResponse.model_validate(await execute_write(operation, db))
+        task_cache.put(updated)
+        response.headers["ETag"] = _etag(updated.version)
+        return updated
         
-        # Eliminar tarea
-        db.delete(task)
-        db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al actualizar la tarea"
+        )
+
+class TaskMove(BaseModel):
+    after_id: Optional[int] = None   # colocar justo después de esta tarea
+    before_id: Optional[int] = None  # colocar justo antes de esta tarea
+
+def _parse_move(task_id: int, move: TaskMove) -> int:
+    """Valida el movimiento y devuelve el ID de la tarea de referencia"""
+    if (move.after_id is None) == (move.before_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Debe indicar exactamente uno de 'after_id' o 'before_id'"
+        )
+    anchor_id = move.after_id if move.after_id is not None else move.before_id
+    if anchor_id == task_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Una tarea no puede moverse respecto de sí misma"
+        )
+    return anchor_id
+
+def _check_version(session: Session, task_id: int, expected_version: Optional[int], *scope):
+    """404 o 412 antes de escribir, si la tarea no existe o su versión cambió"""
+    current_version = session.execute(select(Task.version).where(Task.id == task_id, *scope)).scalar()
+    if current_version is None or (expected_version is not None and current_version != expected_version):
+        raise _conflict_error(task_id, current_version, expected_version)
+
+def _insert_tombstone(session: Session, task_id: int, expected_version: Optional[int], *scope):
+    """
+    Marca de eliminación para la sincronización delta, antes del DELETE: su seq se calcula
+    mientras la fila (quizás la del seq máximo) existe, así la secuencia no retrocede.
+    El INSERT ... SELECT comprueba existencia y versión; si no insertó nada (no escribió),
+    404 o 412.
+    """
+    source = select(Task.id, Task.lista_id).where(Task.id == task_id, *scope)
+    if expected_version is not None:
+        source = source.where(Task.version == expected_version)
+    inserted = session.execute(
+        insert(TaskTombstone).prefix_with("OR REPLACE").from_select(["task_id", "lista_id"], source)
+    ).rowcount
+    if not inserted:
+        current_version = session.execute(select(Task.version).where(Task.id == task_id, *scope)).scalar()
+        raise _conflict_error(task_id, current_version, expected_version)
+
+def _move_rank(session: Session, task_id: int, move: TaskMove, *scope) -> str:
+    """
+    Clave nueva entre la tarea de referencia y la primera vecina con una clave distinta
+    (sin contar la tarea movida). Solo lee la referencia y una vecina por el índice
+    (rank, id); con claves duplicadas la clave resultante es más larga, y el
+    rebalanceo en segundo plano las vuelve a acortar.
+    """
+    anchor_id = _parse_move(task_id, move)
+    anchor = session.execute(select(Task.rank, Task.id).where(Task.id == anchor_id, *scope)).first()
+    if anchor is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tarea de referencia con ID {anchor_id} no encontrada"
+        )
+    if anchor.rank is None:
+        # Tareas sin rango (anteriores a la columna): la tarea en segundo plano las completa en lotes
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La tarea de referencia aún no tiene posición en el orden manual; reintente en unos segundos"
+        )
+    others = [Task.id != task_id, *scope]
+    if move.after_id is not None:
+        neighbor = select(func.min(Task.rank)).where(Task.rank > anchor.rank, *others)
+        lower, upper = anchor.rank, session.execute(neighbor).scalar()
+    else:
+        neighbor = select(func.max(Task.rank)).where(Task.rank < anchor.rank, *others)
+        lower, upper = session.execute(neighbor).scalar(), anchor.rank
+    try:
+        return key_between(lower, upper)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No hay espacio en el orden manual en esa posición; reintente tras el rebalanceo"
+        )
+
+@router.post("/tasks/{task_id}/move", response_model=TaskResponse)
+async def mover_tarea(
+    task_id: int,
+    move: TaskMove,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Cambia la posición de una tarea en el orden manual (sort=rank), justo después
+    de 'after_id' o justo antes de 'before_id'. Solo se reescribe la fila movida.
+    Si se envía If-Match, solo se aplica cuando la versión coincide (si no, 412).
+    """
+    if task_store is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El orden manual no está disponible con el motor journal"
+        )
+    expected_version = _parse_if_match(if_match)
+    _parse_move(task_id, move)
+    
+    def operation(session: Session):
+        _check_version(session, task_id, expected_version)
+        rank = _move_rank(session, task_id, move)
+        stmt = (
+            update(Task).where(Task.id == task_id)
+            .values(rank=rank, version=Task.version + 1)
+            .returning(*Task.__table__.c)
+        )
+        row = session.execute(stmt).first()
+        if row is None:
+            _raise_write_conflict(session, task_id, expected_version)
+        return row
+    
+    try:
+        updated = TaskResponse.model_validate(await execute_write(operation, db))
+        task_cache.put(updated)
+        response.headers["ETag"] = _etag(updated.version)
+        return updated
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al mover la tarea"
+        )
+
+@router.delete("/tasks/{task_id}")
+async def eliminar_tarea(task_id: int, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """
+    Elimina una tarea del sistema permanentemente (DELETE ... RETURNING).
+    Si se envía If-Match, solo se elimina cuando la versión coincide (si no, 412).
+    """
+    expected_version = _parse_if_match(if_match)
+    if task_store is not None:
+        deleted = _journal_write(lambda: task_store.delete(task_id, expected_version), task_id, expected_version)
+        return {"message": f"Tarea '{deleted.titulo}' eliminada correctamente"}
+    
+    def operation(session: Session):
+        _insert_tombstone(session, task_id, expected_version)
+        # Obtener título para el log en la misma sentencia
+        return session.execute(delete(Task).where(Task.id == task_id).returning(Task.titulo)).scalar()
+    
+    try:
+        titulo_tarea = await execute_write(operation, db)
+        task_cache.task_deleted(task_id)
         return {"message": f"Tarea '{titulo_tarea}' eliminada correctamente"}
         
     except HTTPException:
@@ -168,4 +966,4 @@ async def eliminar_tarea(task_id: int, db: Session = Depends(get_db)):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al eliminar la tarea"
-        )
\ No newline at end of file
+        )
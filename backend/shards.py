@@ -0,0 +1,63 @@
+"""
+Router de shards para las listas de tareas.
+
+Cada lista se asigna a un shard (hash del ID de la lista) y sus tareas viven en
+la base SQLite de ese shard, con su propio engine, pool y lock de escritura.
+Las sesiones se crean con models.SessionLocal enlazada al engine del shard.
+Un shard solo tiene las tablas tasks y task_tombstones (models.SHARD_TABLES).
+"""
+import os
+import threading
+from typing import Dict
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, create_shard_tables
+from config import settings
+
+class ShardRouter:
+    """
+    Resuelve el shard de una lista y entrega engines y sesiones por shard
+    """
+
+    def __init__(self, directory: str, shard_count: int):
+        self.directory = directory
+        self.shard_count = max(1, shard_count)
+        self.engines: Dict[int, Engine] = {}
+        self._lock = threading.Lock()
+
+    def shard_for_list(self, list_id: int) -> int:
+        """Shard asignado a una lista nueva (se guarda en la lista y no cambia después)"""
+        return list_id % self.shard_count
+
+    def path(self, shard: int) -> str:
+        return os.path.join(self.directory, f"tasks-{shard}.db")
+
+    def engine(self, shard: int) -> Engine:
+        """Engine del shard; crea la base y su esquema en el primer uso"""
+        engine = self.engines.get(shard)
+        if engine is not None:
+            return engine
+        with self._lock:
+            if shard not in self.engines:
+                os.makedirs(self.directory, exist_ok=True)
+                engine = create_engine(f"sqlite:///{self.path(shard)}", connect_args={"check_same_thread": False})
+                create_shard_tables(engine)
+                self.engines[shard] = engine
+            return self.engines[shard]
+
+    def session(self, shard: int) -> Session:
+        """Sesión enlazada a la base del shard (misma configuración que SessionLocal)"""
+        return SessionLocal(bind=self.engine(shard))
+
+    def dispose(self):
+        """Cierra los pools de conexiones de todos los shards"""
+        with self._lock:
+            for engine in self.engines.values():
+                engine.dispose()
+            self.engines.clear()
+
+# Instancia global del router de shards
+shard_router = ShardRouter(settings.TASK_SHARDS_DIR, settings.TASK_SHARDS)
@@ -0,0 +1,235 @@
+"""
+Caché en memoria de tareas (lectura a través de caché con invalidación en escrituras)
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from sqlalchemy import select
+
+from models import engine, NEXT_CHANGE_SEQ
+from config import settings
+
+class TaskCache:
+    """
+    Caché LRU acotada de tareas por ID y de listados pequeños o primeras páginas.
+
+    Las escrituras de este proceso actualizan las entradas de forma precisa.
+    Para escrituras de otros workers se compara PRAGMA data_version en una
+    conexión dedicada: si cambió, se vacía la caché. Esa conexión también ve
+    los commits de este proceso, por lo que se confirman con commit(), que
+    distingue el commit propio de los ajenos (ver commit()).
+    """
+
+    def __init__(self, max_items: int, max_list_rows: int, max_lists: int, verify_data_version: bool):
+        self.max_items = max_items
+        self.max_list_rows = max_list_rows
+        self.max_lists = max_lists
+        self.verify_data_version = verify_data_version
+        self.items: "OrderedDict[int, Any]" = OrderedDict()
+        # Cada listado guarda sus filas, el filtro de estado y el límite (None = completo)
+        self.lists: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "external_flushes": 0}
+        self._lock = threading.Lock()
+        self._version_conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0
+
+    def _current_data_version(self) -> Optional[int]:
+        """Lee PRAGMA data_version (cambia cuando otra conexión confirma cambios)"""
+        if self._version_conn is None:
+            self._version_conn = sqlite3.connect(engine.url.database, check_same_thread=False)
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _read_data_version(self) -> Optional[int]:
+        try:
+            return self._current_data_version()
+        except sqlite3.Error:
+            return None
+
+    def _read_next_seq(self) -> Optional[int]:
+        """Siguiente seq de cambios leído en la conexión dedicada (abierta por _read_data_version)"""
+        try:
+            return self._version_conn.execute(f"SELECT {NEXT_CHANGE_SEQ.text}").fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def _check_external_writes(self):
+        """Vacía la caché si la base de datos cambió desde la última verificación"""
+        if not self.verify_data_version:
+            return
+        version = self._read_data_version()
+        if version is None or version != self._data_version:
+            self._flush_external()
+            self._data_version = version
+
+    def _flush_external(self):
+        if self.items or self.lists:
+            self.stats["external_flushes"] += 1
+        self.items.clear()
+        self.lists.clear()
+
+    def commit(self, session):
+        """
+        Confirma una transacción de este proceso sin que cuente como escritura externa.
+
+        Antes del commit la transacción tiene el lock de escritura de SQLite, así que
+        un cambio de data_version en ese momento solo puede venir de otra conexión.
+        Después del commit, data_version no basta: otro worker puede confirmar antes de
+        leerla y SQLite cuenta varios commits ajenos como un solo incremento. El commit
+        propio se reconoce si data_version avanzó exactamente uno y el seq de cambios
+        (que avanza con toda escritura de tareas) sigue siendo el de esta transacción;
+        si no, la caché se vacía.
+        """
+        if not self.verify_data_version:
+            session.commit()
+            return
+        # Seq de cambios incluyendo las escrituras de esta transacción
+        own_next_seq = session.execute(select(NEXT_CHANGE_SEQ)).scalar()
+        with self._lock:
+            self._check_external_writes()
+            before = self._data_version
+        session.commit()
+        with self._lock:
+            version = self._read_data_version()
+            own_only = (
+                version is not None and before is not None
+                and version - before <= 1 and self._read_next_seq() == own_next_seq
+            )
+            if not own_only:
+                self._flush_external()
+            self._data_version = version
+
+    def get(self, task_id: int) -> Optional[Any]:
+        """Devuelve la tarea en caché o None"""
+        with self._lock:
+            self._check_external_writes()
+            task = self.items.get(task_id)
+            if task is None:
+                self.stats["misses"] += 1
+                return None
+            self.items.move_to_end(task_id)
+            self.stats["hits"] += 1
+            return task
+
+    def store(self, task: Any):
+        """Guarda una tarea leída de la BD (expulsando la menos usada si hace falta)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.items[task.id] = task
+            self.items.move_to_end(task.id)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def put(self, task: Any):
+        """Reemplaza una tarea actualizada y refleja el cambio en los listados"""
+        self.store(task)
+        with self._lock:
+            for key in list(self.lists):
+                entry = self.lists[key]
+                rows = entry["rows"]
+                index = next((i for i, row in enumerate(rows) if row.id == task.id), None)
+                matches = entry["estado"] is None or entry["estado"] == task.estado
+                if index is not None:
+                    if matches:
+                        rows[index] = task
+                    else:
+                        # Salió del filtro: a una página le faltaría la fila siguiente
+                        del self.lists[key]
+                elif matches and entry["estado"] is not None and not self._beyond_page(entry, task):
+                    # Entró al filtro dentro del rango cacheado
+                    del self.lists[key]
+
+    @staticmethod
+    def _beyond_page(entry: Dict[str, Any], task: Any) -> bool:
+        """La tarea queda después de la última fila de una página llena"""
+        rows = entry["rows"]
+        if entry["limit"] is None or len(rows) < entry["limit"]:
+            return False
+        last = rows[-1]
+        return (task.fecha_creacion, task.id) < (last.fecha_creacion, last.id)
+
+    def get_list(self, key: Hashable) -> Optional[List[Any]]:
+        """Devuelve un listado en caché o None"""
+        with self._lock:
+            self._check_external_writes()
+            entry = self.lists.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.lists.move_to_end(key)
+            self.stats["hits"] += 1
+            return list(entry["rows"])
+
+    def put_list(self, key: Hashable, rows: List[Any], estado: Optional[str] = None, limit: Optional[int] = None):
+        """Guarda un listado completo pequeño o la primera página de un listado"""
+        if not self.enabled or len(rows) > self.max_list_rows:
+            return
+        with self._lock:
+            self.lists[key] = {"rows": list(rows), "estado": estado, "limit": limit}
+            self.lists.move_to_end(key)
+            while len(self.lists) > self.max_lists:
+                self.lists.popitem(last=False)
+
+    def task_created(self, task: Any):
+        """Una tarea nueva es la más reciente: va al inicio de los listados"""
+        self.store(task)
+        with self._lock:
+            for key in list(self.lists):
+                entry = self.lists[key]
+                if entry["estado"] is not None and entry["estado"] != task.estado:
+                    continue
+                rows = entry["rows"]
+                rows.insert(0, task)
+                if entry["limit"] is not None and len(rows) > entry["limit"]:
+                    rows.pop()
+                elif len(rows) > self.max_list_rows:
+                    del self.lists[key]
+
+    def task_deleted(self, task_id: int):
+        """Quita una tarea de la caché y de los listados"""
+        with self._lock:
+            self.stats["invalidations"] += 1
+            self.items.pop(task_id, None)
+            for key in list(self.lists):
+                entry = self.lists[key]
+                rows = entry["rows"]
+                if not any(row.id == task_id for row in rows):
+                    continue
+                if entry["limit"] is not None:
+                    # A una página le faltaría la fila siguiente: descartarla
+                    del self.lists[key]
+                else:
+                    rows[:] = [row for row in rows if row.id != task_id]
+
+    def clear(self):
+        """Invalida toda la caché (escrituras masivas: importación, archivado)"""
+        with self._lock:
+            self.stats["invalidations"] += 1
+            self.items.clear()
+            self.lists.clear()
+
+    def report(self) -> Dict[str, Any]:
+        """Estadísticas de uso de la caché"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "items": len(self.items),
+            "lists": len(self.lists),
+            "max_items": self.max_items,
+            "verify_data_version": self.verify_data_version
+        }
+
+# Instancia global de la caché de tareas
+task_cache = TaskCache(
+    max_items=settings.TASK_CACHE_MAX_ITEMS,
+    max_list_rows=settings.TASK_CACHE_MAX_LIST_ROWS,
+    max_lists=settings.TASK_CACHE_MAX_LISTS,
+    verify_data_version=settings.TASK_CACHE_VERIFY_DATA_VERSION
+)
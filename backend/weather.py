@@ -1,11 +1,167 @@
 """
 Integración con APIs de datos climáticos externos
 """
+import asyncio
 import httpx
+import json
 import os
-from typing import Dict, Any, Optional
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 from fastapi import HTTPException
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone, tzinfo
+
+try:
+    import pytz
+except ImportError:  # sin pytz se usa la hora local del servidor para coordenadas
+    pytz = None
+
+from config import settings
+
+# Se activa mientras el planificador de precarga refresca una ubicación: sus llamadas
+# a proveedores cuentan para el presupuesto de precarga de cada proveedor
+_prefetching: ContextVar[bool] = ContextVar("weather_prefetching", default=False)
+
+# Tablas de iconos (se construyen una vez al importar el módulo)
+DEFAULT_ICON = "🌤️"
+
+# Códigos de condición de WeatherAPI → emoji
+WEATHERAPI_ICONS = {
+    1000: "☀️",  # Sunny
+    1003: "⛅",  # Partly cloudy
+    1006: "☁️",  # Cloudy
+    1009: "☁️",  # Overcast
+    1030: "🌫️",  # Mist
+    1063: "🌦️",  # Patchy rain possible
+    1066: "🌨️",  # Patchy snow possible
+    1069: "🌨️",  # Patchy sleet possible
+    1072: "🌨️",  # Patchy freezing drizzle possible
+    1087: "⛈️",  # Thundery outbreaks possible
+    1114: "❄️",  # Blowing snow
+    1117: "❄️",  # Blizzard
+    1135: "🌫️",  # Fog
+    1147: "🌫️",  # Freezing fog
+    1150: "🌦️",  # Patchy light drizzle
+    1153: "🌦️",  # Light drizzle
+    1168: "🌧️",  # Freezing drizzle
+    1171: "🌧️",  # Heavy freezing drizzle
+    1180: "🌦️",  # Patchy light rain
+    1183: "🌧️",  # Light rain
+    1186: "🌧️",  # Moderate rain at times
+    1189: "🌧️",  # Moderate rain
+    1192: "🌧️",  # Heavy rain at times
+    1195: "🌧️",  # Heavy rain
+    1198: "🌧️",  # Light freezing rain
+    1201: "🌧️",  # Moderate or heavy freezing rain
+    1204: "🌨️",  # Light sleet
+    1207: "🌨️",  # Moderate or heavy sleet
+    1210: "🌨️",  # Patchy light snow
+    1213: "❄️",  # Light snow
+    1216: "❄️",  # Patchy moderate snow
+    1219: "❄️",  # Moderate snow
+    1222: "❄️",  # Patchy heavy snow
+    1225: "❄️",  # Heavy snow
+    1237: "🌨️",  # Ice pellets
+    1240: "🌦️",  # Light rain shower
+    1243: "🌧️",  # Moderate or heavy rain shower
+    1246: "🌧️",  # Torrential rain shower
+    1249: "🌨️",  # Light sleet showers
+    1252: "🌨️",  # Moderate or heavy sleet showers
+    1255: "🌨️",  # Light snow showers
+    1258: "❄️",  # Moderate or heavy snow showers
+    1261: "🌨️",  # Light showers of ice pellets
+    1264: "🌨️",  # Moderate or heavy showers of ice pellets
+    1273: "⛈️",  # Patchy light rain with thunder
+    1276: "⛈️",  # Moderate or heavy rain with thunder
+    1279: "⛈️",  # Patchy light snow with thunder
+    1282: "⛈️",  # Moderate or heavy snow with thunder
+}
+
+# Iconos de OpenWeatherMap → emoji
+OPENWEATHER_ICONS = {
+    '01d': '☀️', '01n': '🌙',
+    '02d': '⛅', '02n': '☁️',
+    '03d': '☁️', '03n': '☁️',
+    '04d': '☁️', '04n': '☁️',
+    '09d': '🌧️', '09n': '🌧️',
+    '10d': '🌦️', '10n': '🌦️',
+    '11d': '⛈️', '11n': '⛈️',
+    '13d': '❄️', '13n': '❄️',
+    '50d': '🌫️', '50n': '🌫️'
+}
+
+# Códigos de condición de wttr.in → emoji
+WTTR_ICONS = {
+    '113': '☀️',  # Sunny
+    '116': '⛅',  # Partly cloudy
+    '119': '☁️',  # Cloudy
+    '122': '☁️',  # Overcast
+    '143': '🌫️',  # Mist
+    '176': '🌦️',  # Nearby rain
+    '179': '🌨️',  # Nearby snow
+    '182': '🌨️',  # Nearby sleet
+    '185': '🌨️',  # Nearby freezing drizzle
+    '200': '⛈️',  # Nearby thundery outbreaks
+    '227': '❄️',  # Blowing snow
+    '230': '❄️',  # Blizzard
+    '248': '🌫️',  # Fog
+    '260': '🌫️',  # Freezing fog
+    '263': '🌦️',  # Patchy light drizzle
+    '266': '🌦️',  # Light drizzle
+    '281': '🌧️',  # Freezing drizzle
+    '284': '🌧️',  # Heavy freezing drizzle
+    '293': '🌦️',  # Patchy light rain
+    '296': '🌧️',  # Light rain
+    '299': '🌧️',  # Moderate rain at times
+    '302': '🌧️',  # Moderate rain
+    '305': '🌧️',  # Heavy rain at times
+    '308': '🌧️',  # Heavy rain
+    '311': '🌧️',  # Light freezing rain
+    '314': '🌧️',  # Moderate or heavy freezing rain
+    '317': '🌨️',  # Light sleet
+    '320': '🌨️',  # Moderate or heavy sleet
+    '323': '🌨️',  # Patchy light snow
+    '326': '❄️',  # Light snow
+    '329': '❄️',  # Patchy moderate snow
+    '332': '❄️',  # Moderate snow
+    '335': '❄️',  # Patchy heavy snow
+    '338': '❄️',  # Heavy snow
+    '350': '🌨️',  # Ice pellets
+    '353': '🌦️',  # Light rain shower
+    '356': '🌧️',  # Moderate or heavy rain shower
+    '359': '🌧️',  # Torrential rain shower
+    '362': '🌨️',  # Light sleet showers
+    '365': '🌨️',  # Moderate or heavy sleet showers
+    '368': '🌨️',  # Light snow showers
+    '371': '❄️',  # Moderate or heavy snow showers
+    '374': '🌨️',  # Light showers of ice pellets
+    '377': '🌨️',  # Moderate or heavy showers of ice pellets
+    '386': '⛈️',  # Patchy light rain with thunder
+    '389': '⛈️',  # Moderate or heavy rain with thunder
+    '392': '⛈️',  # Patchy light snow with thunder
+    '395': '⛈️',  # Moderate or heavy snow with thunder
+}
+
+@lru_cache(maxsize=512)
+def resolve_timezone(tz_id: str) -> Optional[tzinfo]:
+    """Zona horaria IANA de un proveedor (p. ej. 'America/Lima'), resuelta una vez por ID"""
+    if pytz is None:
+        return None
+    try:
+        return pytz.timezone(tz_id)
+    except pytz.UnknownTimeZoneError:
+        return None
+
+@lru_cache(maxsize=64)
+def offset_timezone(offset_seconds: int) -> tzinfo:
+    """Zona horaria de desfase fijo (OpenWeatherMap informa el desfase en segundos)"""
+    return timezone(timedelta(seconds=offset_seconds))
+
+def encode_payload(data: Dict[str, Any]) -> bytes:
+    """JSON con la misma codificación que JSONResponse (se guarda junto a la cache)"""
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
 
 class WeatherService:
     """
@@ -18,36 +174,44 @@ class WeatherService:
         self.weatherapi_key = os.getenv("WEATHERAPI_KEY")
         self.accuweather_key = os.getenv("ACCUWEATHER_API_KEY")
         
-        # URLs base de diferentes APIs
-        self.openweather_url = "https://api.openweathermap.org/data/2.5/weather"
-        self.weatherapi_url = "https://api.weatherapi.com/v1/current.json"
+        # URLs de diferentes APIs (bases configurables para apuntar a un simulador)
+        self.openweather_url = f"{settings.OPENWEATHER_BASE_URL}/data/2.5/weather"
+        self.weatherapi_url = f"{settings.WEATHERAPI_BASE_URL}/v1/current.json"
         self.accuweather_url = "https://dataservice.accuweather.com/currentconditions/v1"
+        self.wttr_url = settings.WTTR_BASE_URL
+        self.geocoding_url = f"{settings.BIGDATACLOUD_BASE_URL}/data/reverse-geocode-client"
         
         self.cache = {}
         self.cache_duration = timedelta(minutes=5)  # Cache por 5 minutos
         
-    async def get_weather(self, city: str = "Lima") -> Dict[str, Any]:
+        # Popularidad de cada clave (puntaje con decaimiento) y llamadas de precarga por proveedor
+        self.popularity: Dict[str, Dict[str, Any]] = {}
+        self.prefetch_calls: Dict[str, deque] = {}
+        
+    async def get_weather(self, city: str = "Lima", prefetch: bool = False) -> Dict[str, Any]:
         """
-        Obtiene información del clima para una ciudad usando múltiples APIs
+        Obtiene información del clima para una ciudad usando múltiples APIs.
+        Con prefetch=True ignora la cache y no cuenta para la popularidad.
         """
         # Verificar cache
-        cache_key = f"weather_{city}"
-        if cache_key in self.cache:
-            cached_data, timestamp = self.cache[cache_key]
-            if datetime.now() - timestamp < self.cache_duration:
-                return cached_data
+        cache_key = self._city_cache_key(city)
+        if not prefetch:
+            self._record_request(cache_key, {"city": city})
+            cached = self._get_cached(cache_key)
+            if cached:
+                return cached[0]
 
         # Intentar diferentes APIs en orden de preferencia
         weather_data = None
         
         # 1. Intentar WeatherAPI (más generoso)
-        if self.weatherapi_key:
+        if self.weatherapi_key and self._can_call("weatherapi"):
             weather_data = await self._get_weatherapi_data(city)
             if weather_data and weather_data.get("success"):
                 return self._cache_and_return(cache_key, weather_data)
         
         # 2. Intentar OpenWeatherMap
-        if self.openweather_key:
+        if self.openweather_key and self._can_call("openweather"):
             weather_data = await self._get_openweather_data(city)
             if weather_data and weather_data.get("success"):
                 return self._cache_and_return(cache_key, weather_data)
@@ -59,36 +223,38 @@ class WeatherService:
                 return self._cache_and_return(cache_key, weather_data)
         
         # 4. Si no hay APIs configuradas, usar API pública gratuita (sin key)
-        weather_data = await self._get_free_weather_data(city)
-        if weather_data and weather_data.get("success"):
-            return self._cache_and_return(cache_key, weather_data)
+        if self._can_call("wttr"):
+            weather_data = await self._get_free_weather_data(city)
+            if weather_data and weather_data.get("success"):
+                return self._cache_and_return(cache_key, weather_data)
         
         # 5. Fallback a datos de prueba
         print(f"[Weather] Usando datos de prueba para {city} (configurar API keys para datos reales)")
         return self._get_demo_weather_data(city)
     
-    async def get_weather_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
+    async def get_weather_by_coords(self, lat: float, lon: float, prefetch: bool = False) -> Dict[str, Any]:
         """
         Obtiene información del clima para coordenadas usando múltiples APIs
         """
         # Verificar cache
-        cache_key = f"weather_{lat}_{lon}"
-        if cache_key in self.cache:
-            cached_data, timestamp = self.cache[cache_key]
-            if datetime.now() - timestamp < self.cache_duration:
-                return cached_data
+        cache_key = self._coords_cache_key(lat, lon)
+        if not prefetch:
+            self._record_request(cache_key, {"lat": lat, "lon": lon})
+            cached = self._get_cached(cache_key)
+            if cached:
+                return cached[0]
 
         # Intentar diferentes APIs en orden de preferencia
         weather_data = None
         
         # 1. Intentar WeatherAPI (más generoso)
-        if self.weatherapi_key:
+        if self.weatherapi_key and self._can_call("weatherapi"):
             weather_data = await self._get_weatherapi_data_coords(lat, lon)
             if weather_data and weather_data.get("success"):
                 return self._cache_and_return(cache_key, weather_data)
         
         # 2. Intentar OpenWeatherMap
-        if self.openweather_key:
+        if self.openweather_key and self._can_call("openweather"):
             weather_data = await self._get_openweather_data_coords(lat, lon)
             if weather_data and weather_data.get("success"):
                 return self._cache_and_return(cache_key, weather_data)
@@ -97,13 +263,14 @@ class WeatherService:
         # Necesitamos convertir coords a ciudad para wttr.in
         try:
             # Usar reverse geocoding simple o fallback a Lima
-            city = await self._coords_to_city(lat, lon)
-            weather_data = await self._get_free_weather_data(city)
-            if weather_data and weather_data.get("success"):
-                # Actualizar con coordenadas reales
-                weather_data["lat"] = lat
-                weather_data["lon"] = lon
-                return self._cache_and_return(cache_key, weather_data)
+            if self._can_call("bigdatacloud") and self._can_call("wttr"):
+                city = await self._coords_to_city(lat, lon)
+                weather_data = await self._get_free_weather_data(city)
+                if weather_data and weather_data.get("success"):
+                    # Actualizar con coordenadas reales
+                    weather_data["lat"] = lat
+                    weather_data["lon"] = lon
+                    return self._cache_and_return(cache_key, weather_data)
         except:
             pass
         
@@ -114,9 +281,170 @@ class WeatherService:
         demo_data["lon"] = lon
         return demo_data
     
+    async def get_weather_body(self, city: str = "Lima") -> bytes:
+        """
+        Como get_weather, pero devuelve el JSON codificado: un acierto de cache
+        responde los bytes guardados sin volver a serializar
+        """
+        cache_key = self._city_cache_key(city)
+        body = self._get_cached_body(cache_key)
+        if body is not None:
+            self._record_request(cache_key, {"city": city})
+            return body
+        data = await self.get_weather(city)
+        return self._get_cached_body(cache_key) or encode_payload(data)
+    
+    async def get_weather_by_coords_body(self, lat: float, lon: float) -> bytes:
+        """Como get_weather_by_coords, con el JSON codificado (ver get_weather_body)"""
+        cache_key = self._coords_cache_key(lat, lon)
+        body = self._get_cached_body(cache_key)
+        if body is not None:
+            self._record_request(cache_key, {"lat": lat, "lon": lon})
+            return body
+        data = await self.get_weather_by_coords(lat, lon)
+        return self._get_cached_body(cache_key) or encode_payload(data)
+    
+    async def get_weather_batch(self, locations: List[Dict[str, Any]], concurrency: int = None) -> List[Dict[str, Any]]:
+        """
+        Obtiene el clima para varias ciudades o coordenadas en una sola llamada.
+        Responde desde la cache lo disponible y consulta el resto en paralelo
+        con un límite de concurrencia.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.WEATHER_BATCH_CONCURRENCY)
+        
+        def cache_key_for(location: Dict[str, Any]) -> str:
+            if location.get("lat") is not None and location.get("lon") is not None:
+                return self._coords_cache_key(location["lat"], location["lon"])
+            return self._city_cache_key(location.get("city") or "Lima")
+        
+        async def fetch(location: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                if location.get("lat") is not None and location.get("lon") is not None:
+                    return await self.get_weather_by_coords(location["lat"], location["lon"])
+                return await self.get_weather(location.get("city") or "Lima")
+        
+        keys = [cache_key_for(location) for location in locations]
+        hits: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        misses: Dict[str, Dict[str, Any]] = {}
+        for key, location in zip(keys, locations):
+            if key in hits or key in misses:
+                continue
+            cached = self._get_cached(key)
+            if cached:
+                hits[key] = cached
+                self._record_request(key, location)
+            else:
+                misses[key] = location
+        
+        # Consultar las ubicaciones no cacheadas (sin duplicados) en paralelo
+        fetched = dict(zip(misses, await asyncio.gather(*(fetch(location) for location in misses.values()))))
+        
+        results = []
+        for key, location in zip(keys, locations):
+            if key in hits:
+                data, age = hits[key]
+                source = "cache"
+            else:
+                data, age = fetched[key], 0.0
+                source = "upstream"
+            results.append({
+                "query": location,
+                "source": source,
+                "age_seconds": round(age, 1),
+                "data": data
+            })
+        return results
+    
+    def _city_cache_key(self, city: str) -> str:
+        """Clave de cache para una ciudad"""
+        return f"weather_{city}"
+    
+    def _coords_cache_key(self, lat: float, lon: float) -> str:
+        """Clave de cache para coordenadas"""
+        return f"weather_{lat}_{lon}"
+    
+    def _get_cached(self, cache_key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Devuelve (datos, antigüedad en segundos) si la entrada sigue vigente"""
+        if cache_key in self.cache:
+            cached_data, timestamp, _ = self.cache[cache_key]
+            age = datetime.now() - timestamp
+            if age < self.cache_duration:
+                return cached_data, age.total_seconds()
+        return None
+    
+    def _get_cached_body(self, cache_key: str) -> Optional[bytes]:
+        """JSON ya codificado de una entrada vigente"""
+        entry = self.cache.get(cache_key)
+        if entry is not None and datetime.now() - entry[1] < self.cache_duration:
+            return entry[2]
+        return None
+    
+    def _record_request(self, cache_key: str, location: Dict[str, Any]):
+        """Suma una solicitud al puntaje de popularidad (con decaimiento exponencial)"""
+        now = time.monotonic()
+        entry = self.popularity.get(cache_key)
+        if entry is None:
+            if len(self.popularity) >= settings.WEATHER_POPULARITY_MAX_KEYS:
+                # Descartar la clave menos popular
+                least = min(self.popularity, key=lambda key: self._decayed_score(self.popularity[key], now))
+                del self.popularity[least]
+            entry = self.popularity[cache_key] = {"score": 0.0, "updated": now, "location": location}
+        entry["score"] = self._decayed_score(entry, now) + 1
+        entry["updated"] = now
+    
+    def _decayed_score(self, entry: Dict[str, Any], now: float) -> float:
+        """Puntaje de popularidad a la fecha con vida media configurable"""
+        elapsed = now - entry["updated"]
+        return entry["score"] * 0.5 ** (elapsed / settings.WEATHER_POPULARITY_HALF_LIFE)
+    
+    def top_locations(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """Las claves más solicitadas con la ubicación necesaria para refrescarlas"""
+        now = time.monotonic()
+        ranked = sorted(
+            self.popularity.items(),
+            key=lambda item: self._decayed_score(item[1], now),
+            reverse=True
+        )
+        return [(key, entry["location"]) for key, entry in ranked[:limit]]
+    
+    def _record_upstream_call(self, provider: str):
+        """Registra una llamada a un proveedor externo (solo cuentan las de precarga)"""
+        if _prefetching.get():
+            self.prefetch_calls.setdefault(provider, deque()).append(time.monotonic())
+    
+    def prefetch_calls_last_hour(self, provider: str) -> int:
+        """Llamadas de precarga a un proveedor en la última hora (ventana deslizante)"""
+        calls = self.prefetch_calls.get(provider)
+        if not calls:
+            return 0
+        cutoff = time.monotonic() - 3600
+        while calls and calls[0] < cutoff:
+            calls.popleft()
+        return len(calls)
+    
+    def _can_call(self, provider: str) -> bool:
+        """Las consultas de usuarios siempre; la precarga solo con presupuesto en ese proveedor"""
+        return not _prefetching.get() or self.prefetch_calls_last_hour(provider) < settings.WEATHER_PREFETCH_BUDGET_PER_HOUR
+    
+    def providers_for(self, location: Dict[str, Any]) -> List[str]:
+        """Proveedores que puede consultar una ubicación, en orden (sin contar AccuWeather, que no llama)"""
+        providers = []
+        if self.weatherapi_key:
+            providers.append("weatherapi")
+        if self.openweather_key:
+            providers.append("openweather")
+        if location.get("lat") is not None and location.get("lon") is not None:
+            providers.append("bigdatacloud")
+        providers.append("wttr")
+        return providers
+    
+    def _timeout(self, default: float) -> float:
+        """Timeout de una llamada a proveedor (WEATHER_UPSTREAM_TIMEOUT_SECONDS si está definido)"""
+        return settings.WEATHER_UPSTREAM_TIMEOUT_SECONDS or default
+    
     def _cache_and_return(self, cache_key: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Guarda en cache y devuelve los datos"""
-        self.cache[cache_key] = (data, datetime.now())
+        """Guarda en cache (con el JSON ya codificado) y devuelve los datos"""
+        self.cache[cache_key] = (data, datetime.now(), encode_payload(data))
         return data
     
     async def _get_weatherapi_data(self, city: str) -> Optional[Dict[str, Any]]:
@@ -128,7 +456,8 @@ class WeatherService:
                 "lang": "es"
             }
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            self._record_upstream_call("weatherapi")
+            async with httpx.AsyncClient(timeout=self._timeout(10.0)) as client:
                 response = await client.get(self.weatherapi_url, params=params)
                 response.raise_for_status()
                 
@@ -165,7 +494,8 @@ class WeatherService:
                 "lang": "es"
             }
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            self._record_upstream_call("openweather")
+            async with httpx.AsyncClient(timeout=self._timeout(10.0)) as client:
                 response = await client.get(self.openweather_url, params=params)
                 response.raise_for_status()
                 
@@ -208,9 +538,10 @@ class WeatherService:
         """Consulta wttr.in API gratuita sin autenticación"""
         try:
             # wttr.in es una API gratuita sin necesidad de key
-            url = f"https://wttr.in/{city}?format=j1"
+            url = f"{self.wttr_url}/{city}?format=j1"
             
-            async with httpx.AsyncClient(timeout=15.0) as client:
+            self._record_upstream_call("wttr")
+            async with httpx.AsyncClient(timeout=self._timeout(15.0)) as client:
                 response = await client.get(url)
                 response.raise_for_status()
                 
@@ -248,25 +579,17 @@ class WeatherService:
                 "lang": "es"
             }
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            self._record_upstream_call("weatherapi")
+            async with httpx.AsyncClient(timeout=self._timeout(10.0)) as client:
                 response = await client.get(self.weatherapi_url, params=params)
                 response.raise_for_status()
                 
             data = response.json()
             
-            # Obtener zona horaria local del usuario
-            from datetime import datetime, timezone
-            import pytz
-            
-            try:
-                # Intentar obtener zona horaria de la respuesta
-                tz_info = data["location"].get("tz_id", "UTC")
-                local_tz = pytz.timezone(tz_info)
-                local_time = datetime.now(local_tz)
-                time_str = local_time.strftime("%H:%M")
-            except:
-                # Fallback a hora local del servidor
-                time_str = datetime.now().strftime("%H:%M")
+            # Hora local de la ubicación según la zona horaria de la respuesta
+            local_tz = resolve_timezone(data["location"].get("tz_id", "UTC"))
+            # Fallback a hora local del servidor
+            time_str = datetime.now(local_tz).strftime("%H:%M") if local_tz else datetime.now().strftime("%H:%M")
             
             processed_data = {
                 "ciudad": f"{data['location']['name']}, {data['location']['country']}",
@@ -303,20 +626,17 @@ class WeatherService:
                 "lang": "es"
             }
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            self._record_upstream_call("openweather")
+            async with httpx.AsyncClient(timeout=self._timeout(10.0)) as client:
                 response = await client.get(self.openweather_url, params=params)
                 response.raise_for_status()
                 
             data = response.json()
             
             # Calcular hora local usando timezone offset
-            from datetime import datetime, timezone, timedelta
             try:
-                offset_seconds = data.get("timezone", 0)
-                local_tz = timezone(timedelta(seconds=offset_seconds))
-                local_time = datetime.now(local_tz)
-                time_str = local_time.strftime("%H:%M")
-            except:
+                time_str = datetime.now(offset_timezone(int(data.get("timezone", 0)))).strftime("%H:%M")
+            except (TypeError, ValueError):
                 time_str = datetime.now().strftime("%H:%M")
             
             processed_data = {
@@ -346,9 +666,10 @@ class WeatherService:
         """Convierte coordenadas a nombre de ciudad (simple reverse geocoding)"""
         try:
             # Usar un servicio gratuito de reverse geocoding
-            url = f"https://api.bigdatacloud.net/data/reverse-geocode-client?latitude={lat}&longitude={lon}&localityLanguage=es"
+            url = f"{self.geocoding_url}?latitude={lat}&longitude={lon}&localityLanguage=es"
             
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            self._record_upstream_call("bigdatacloud")
+            async with httpx.AsyncClient(timeout=self._timeout(5.0)) as client:
                 response = await client.get(url)
                 response.raise_for_status()
                 
@@ -377,127 +698,15 @@ class WeatherService:
     
     def _weatherapi_icon_to_emoji(self, code: int) -> str:
         """Convierte códigos de WeatherAPI a emojis"""
-        icon_map = {
-            1000: "☀️",  # Sunny
-            1003: "⛅",  # Partly cloudy
-            1006: "☁️",  # Cloudy
-            1009: "☁️",  # Overcast
-            1030: "🌫️",  # Mist
-            1063: "🌦️",  # Patchy rain possible
-            1066: "🌨️",  # Patchy snow possible
-            1069: "🌨️",  # Patchy sleet possible
-            1072: "🌨️",  # Patchy freezing drizzle possible
-            1087: "⛈️",  # Thundery outbreaks possible
-            1114: "❄️",  # Blowing snow
-            1117: "❄️",  # Blizzard
-            1135: "🌫️",  # Fog
-            1147: "🌫️",  # Freezing fog
-            1150: "🌦️",  # Patchy light drizzle
-            1153: "🌦️",  # Light drizzle
-            1168: "🌧️",  # Freezing drizzle
-            1171: "🌧️",  # Heavy freezing drizzle
-            1180: "🌦️",  # Patchy light rain
-            1183: "🌧️",  # Light rain
-            1186: "🌧️",  # Moderate rain at times
-            1189: "🌧️",  # Moderate rain
-            1192: "🌧️",  # Heavy rain at times
-            1195: "🌧️",  # Heavy rain
-            1198: "🌧️",  # Light freezing rain
-            1201: "🌧️",  # Moderate or heavy freezing rain
-            1204: "🌨️",  # Light sleet
-            1207: "🌨️",  # Moderate or heavy sleet
-            1210: "🌨️",  # Patchy light snow
-            1213: "❄️",  # Light snow
-            1216: "❄️",  # Patchy moderate snow
-            1219: "❄️",  # Moderate snow
-            1222: "❄️",  # Patchy heavy snow
-            1225: "❄️",  # Heavy snow
-            1237: "🌨️",  # Ice pellets
-            1240: "🌦️",  # Light rain shower
-            1243: "🌧️",  # Moderate or heavy rain shower
-            1246: "🌧️",  # Torrential rain shower
-            1249: "🌨️",  # Light sleet showers
-            1252: "🌨️",  # Moderate or heavy sleet showers
-            1255: "🌨️",  # Light snow showers
-            1258: "❄️",  # Moderate or heavy snow showers
-            1261: "🌨️",  # Light showers of ice pellets
-            1264: "🌨️",  # Moderate or heavy showers of ice pellets
-            1273: "⛈️",  # Patchy light rain with thunder
-            1276: "⛈️",  # Moderate or heavy rain with thunder
-            1279: "⛈️",  # Patchy light snow with thunder
-            1282: "⛈️",  # Moderate or heavy snow with thunder
-        }
-        return icon_map.get(code, "🌤️")
+        return WEATHERAPI_ICONS.get(code, DEFAULT_ICON)
     
     def _openweather_icon_to_emoji(self, icon: str) -> str:
         """Convierte códigos de OpenWeatherMap a emojis"""
-        icon_map = {
-            '01d': '☀️', '01n': '🌙',
-            '02d': '⛅', '02n': '☁️',
-            '03d': '☁️', '03n': '☁️',
-            '04d': '☁️', '04n': '☁️',
-            '09d': '🌧️', '09n': '🌧️',
-            '10d': '🌦️', '10n': '🌦️',
-            '11d': '⛈️', '11n': '⛈️',
-            '13d': '❄️', '13n': '❄️',
-            '50d': '🌫️', '50n': '🌫️'
-        }
-        return icon_map.get(icon, "🌤️")
+        return OPENWEATHER_ICONS.get(icon, DEFAULT_ICON)
     
     def _wttr_icon_to_emoji(self, code: str) -> str:
         """Convierte códigos de wttr.in a emojis"""
-        code = str(code)
-        icon_map = {
-            '113': '☀️',  # Sunny
-            '116': '⛅',  # Partly cloudy
-            '119': '☁️',  # Cloudy
-            '122': '☁️',  # Overcast
-            '143': '🌫️',  # Mist
-            '176': '🌦️',  # Nearby rain
-            '179': '🌨️',  # Nearby snow
-            '182': '🌨️',  # Nearby sleet
-            '185': '🌨️',  # Nearby freezing drizzle
-            '200': '⛈️',  # Nearby thundery outbreaks
-            '227': '❄️',  # Blowing snow
-            '230': '❄️',  # Blizzard
-            '248': '🌫️',  # Fog
-            '260': '🌫️',  # Freezing fog
-            '263': '🌦️',  # Patchy light drizzle
-            '266': '🌦️',  # Light drizzle
-            '281': '🌧️',  # Freezing drizzle
-            '284': '🌧️',  # Heavy freezing drizzle
-            '293': '🌦️',  # Patchy light rain
-            '296': '🌧️',  # Light rain
-            '299': '🌧️',  # Moderate rain at times
-            '302': '🌧️',  # Moderate rain
-            '305': '🌧️',  # Heavy rain at times
-            '308': '🌧️',  # Heavy rain
-            '311': '🌧️',  # Light freezing rain
-            '314': '🌧️',  # Moderate or heavy freezing rain
-            '317': '🌨️',  # Light sleet
-            '320': '🌨️',  # Moderate or heavy sleet
-            '323': '🌨️',  # Patchy light snow
-            '326': '❄️',  # Light snow
-            '329': '❄️',  # Patchy moderate snow
-            '332': '❄️',  # Moderate snow
-            '335': '❄️',  # Patchy heavy snow
-            '338': '❄️',  # Heavy snow
-            '350': '🌨️',  # Ice pellets
-            '353': '🌦️',  # Light rain shower
-            '356': '🌧️',  # Moderate or heavy rain shower
-            '359': '🌧️',  # Torrential rain shower
-            '362': '🌨️',  # Light sleet showers
-            '365': '🌨️',  # Moderate or heavy sleet showers
-            '368': '🌨️',  # Light snow showers
-            '371': '❄️',  # Moderate or heavy snow showers
-            '374': '🌨️',  # Light showers of ice pellets
-            '377': '🌨️',  # Moderate or heavy showers of ice pellets
-            '386': '⛈️',  # Patchy light rain with thunder
-            '389': '⛈️',  # Moderate or heavy rain with thunder
-            '392': '⛈️',  # Patchy light snow with thunder
-            '395': '⛈️',  # Moderate or heavy snow with thunder
-        }
-        return icon_map.get(code, "🌤️")
+        return WTTR_ICONS.get(str(code), DEFAULT_ICON)
     
     def _get_error_weather_data(self, error_message: str) -> Dict[str, Any]:
         """Datos de error cuando falla la API"""
@@ -514,9 +723,83 @@ class WeatherService:
             "error": error_message
         }
 
+class WeatherPrefetcher:
+    """
+    Refresca en segundo plano las claves más populares poco antes de que
+    expiren, respetando un presupuesto de llamadas por proveedor
+    """
+    
+    def __init__(self, service: WeatherService):
+        self.service = service
+        self.stats = {"refreshed": 0, "skipped_budget": 0}
+    
+    def _needs_refresh(self, cache_key: str) -> bool:
+        """La entrada falta o expira dentro del margen de anticipación"""
+        cached = self.service._get_cached(cache_key)
+        if not cached:
+            return True
+        age = cached[1]
+        return age >= self.service.cache_duration.total_seconds() - settings.WEATHER_PREFETCH_LEAD_SECONDS
+    
+    def _within_budget(self, location: Dict[str, Any]) -> bool:
+        """
+        Algún proveedor de la ubicación tiene presupuesto de precarga. Durante el
+        refresco se omiten los proveedores agotados (ver WeatherService._can_call).
+        """
+        return any(
+            self.service.prefetch_calls_last_hour(provider) < settings.WEATHER_PREFETCH_BUDGET_PER_HOUR
+            for provider in self.service.providers_for(location)
+        )
+    
+    async def refresh(self, location: Dict[str, Any]):
+        """Consulta una ubicación ignorando la cache (las llamadas cuentan como precarga)"""
+        token = _prefetching.set(True)
+        try:
+            if location.get("lat") is not None and location.get("lon") is not None:
+                await self.service.get_weather_by_coords(location["lat"], location["lon"], prefetch=True)
+            else:
+                await self.service.get_weather(location["city"], prefetch=True)
+        finally:
+            _prefetching.reset(token)
+        self.stats["refreshed"] += 1
+    
+    async def tick(self):
+        """Refresca las N claves más populares que estén por expirar"""
+        for cache_key, location in self.service.top_locations(settings.WEATHER_PREFETCH_TOP_N):
+            if not self._needs_refresh(cache_key):
+                continue
+            if not self._within_budget(location):
+                self.stats["skipped_budget"] += 1
+                continue
+            await self.refresh(location)
+    
+    async def warm(self):
+        """Precarga las ciudades configuradas al arrancar"""
+        for city in settings.WEATHER_PREFETCH_WARM_CITIES:
+            if self._within_budget({"city": city}) and self._needs_refresh(self.service._city_cache_key(city)):
+                # Contar como solicitud para que entre en el ranking de popularidad
+                self.service._record_request(self.service._city_cache_key(city), {"city": city})
+                await self.refresh({"city": city})
+    
+    async def run(self):
+        """Bucle del planificador de precarga"""
+        try:
+            await self.warm()
+        except Exception as e:
+            print(f"[Weather] Error precargando clima: {e}")
+        while True:
+            await asyncio.sleep(settings.WEATHER_PREFETCH_INTERVAL_SECONDS)
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"[Weather] Error en precarga de clima: {e}")
+
 # Instancia global del servicio de clima
 weather_service = WeatherService()
 
+# Planificador de precarga por popularidad
+weather_prefetcher = WeatherPrefetcher(weather_service)
+
 async def get_current_weather(city: str = "Lima") -> Dict[str, Any]:
     """
     Endpoint function para obtener el clima actual por nombre de ciudad
@@ -527,4 +810,22 @@ async def get_current_weather_by_coords(lat: float, lon: float) -> Dict[str, Any
     """
     Endpoint function para obtener el clima actual por coordenadas
     """
-    return await weather_service.get_weather_by_coords(lat, lon)
\ No newline at end of file
+    return await weather_service.get_weather_by_coords(lat, lon)
+
+async def get_current_weather_body(city: str = "Lima") -> bytes:
+    """
+    Endpoint function: clima por ciudad como JSON codificado (aciertos de cache sin serializar)
+    """
+    return await weather_service.get_weather_body(city)
+
+async def get_current_weather_by_coords_body(lat: float, lon: float) -> bytes:
+    """
+    Endpoint function: clima por coordenadas como JSON codificado
+    """
+    return await weather_service.get_weather_by_coords_body(lat, lon)
+
+async def get_current_weather_batch(locations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Endpoint function para obtener el clima de varias ubicaciones a la vez
+    """
+    return await weather_service.get_weather_batch(locations)
@@ -0,0 +1,158 @@
+"""
+Cola de escrituras con commit agrupado (group commit) para SQLite.
+
+Un único escritor recoge las mutaciones que llegan durante una ventana corta
+(o hasta un tamaño máximo de lote), las confirma en una sola transacción y
+luego responde a cada llamador.
+"""
+import asyncio
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from models import SessionLocal
+from task_cache import task_cache
+from config import settings
+
+# Una operación de escritura recibe la sesión y devuelve el resultado para el llamador.
+# Solo puede lanzar HTTPException antes de modificar datos (validaciones, 404, 412).
+WriteOperation = Callable[[Session], Any]
+
+class WriteQueue:
+    """
+    Escritor único que agrupa mutaciones en transacciones compartidas
+    """
+
+    def __init__(self, max_batch_size: int, window_ms: float):
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.stats = {"batches": 0, "writes": 0, "fallbacks": 0}
+
+    @property
+    def running(self) -> bool:
+        return self.worker is not None and not self.worker.done()
+
+    def start(self):
+        """Inicia el escritor en el event loop actual"""
+        if not self.running:
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detiene el escritor después de procesar lo pendiente"""
+        if self.running:
+            await self.queue.put(None)
+            await self.worker
+        self.worker = None
+
+    async def submit(self, operation: WriteOperation) -> Any:
+        """Encola una operación y espera su resultado tras el commit del lote"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((operation, future))
+        return await future
+
+    async def _collect_batch(self) -> Tuple[List[Tuple[WriteOperation, asyncio.Future]], bool]:
+        """Espera la primera operación y agrupa las que lleguen dentro de la ventana"""
+        item = await self.queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+
+        while len(batch) < self.max_batch_size:
+            # Primero vaciar lo que ya está en cola sin esperar
+            if self.queue.empty():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self.queue.get_nowait()
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        """Bucle del escritor único"""
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect_batch()
+            if not batch:
+                continue
+            operations = [operation for operation, _ in batch]
+            try:
+                results = await run_in_threadpool(self._commit_batch, operations)
+            except Exception as e:
+                results = [(None, e)] * len(batch)
+
+            for (_, future), (result, error) in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def _commit_batch(self, operations: List[WriteOperation]) -> List[Tuple[Any, Optional[BaseException]]]:
+        """
+        Ejecuta todas las operaciones en una transacción con un solo commit.
+        Si algo inesperado falla, revierte el lote y repite cada operación por separado.
+        """
+        results = []
+        db = SessionLocal()
+        try:
+            for operation in operations:
+                try:
+                    results.append((operation(db), None))
+                except HTTPException as e:
+                    results.append((None, e))
+            task_cache.commit(db)
+            self.stats["batches"] += 1
+            self.stats["writes"] += len(operations)
+            return results
+        except Exception:
+            db.rollback()
+        finally:
+            db.close()
+
+        # Aislar la operación que falló: una transacción por operación
+        self.stats["fallbacks"] += 1
+        return [self._commit_single(operation) for operation in operations]
+
+    def _commit_single(self, operation: WriteOperation) -> Tuple[Any, Optional[BaseException]]:
+        """Ejecuta una operación en su propia transacción"""
+        db = SessionLocal()
+        try:
+            result = operation(db)
+            task_cache.commit(db)
+            self.stats["batches"] += 1
+            self.stats["writes"] += 1
+            return result, None
+        except Exception as e:
+            db.rollback()
+            return None, e
+        finally:
+            db.close()
+
+# Instancia global de la cola de escrituras
+write_queue = WriteQueue(settings.WRITE_QUEUE_MAX_BATCH, settings.WRITE_QUEUE_WINDOW_MS)
+
+async def execute_write(operation: WriteOperation, db: Session) -> Any:
+    """
+    Ejecuta una escritura: por la cola agrupada si está activa,
+    o directamente con la sesión de la petición y su propio commit
+    """
+    if write_queue.running:
+        return await write_queue.submit(operation)
+    result = operation(db)
+    task_cache.commit(db)
+    return result
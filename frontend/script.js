@@ -9,6 +9,16 @@ class TaskTracker {
         this.currentFilter = 'todas';
         this.editingTaskId = null;
         this.weatherUpdateInterval = null;
+        this.lastSeq = 0; // Última secuencia de cambios sincronizada
+        
+        // Lista virtualizada: solo se renderizan las filas visibles y se pagina por cursor
+        this.PAGE_SIZE = 100;
+        this.ROW_HEIGHT = 96;
+        this.OVERSCAN = 6;
+        this.nextCursor = null;
+        this.loadingPage = false;
+        this.rowElements = new Map(); // id de tarea -> elemento renderizado
+        this.renderScheduled = false;
         
         // URLs dinámicas de la API (funciona tanto en localhost como en producción)
         const currentHost = window.location.origin;
@@ -42,6 +52,25 @@ class TaskTracker {
             if (e.key === 'Enter') this.handleTaskSubmit();
         });
         
+        // Lista de tareas: scroll virtual y delegación de eventos por fila
+        const tasksList = document.getElementById('tasksList');
+        tasksList.addEventListener('scroll', () => this.scheduleRender());
+        tasksList.addEventListener('change', (e) => {
+            if (e.target.classList.contains('task-checkbox')) {
+                this.toggleTaskStatus(parseInt(e.target.dataset.taskId));
+            }
+        });
+        tasksList.addEventListener('click', (e) => {
+            const button = e.target.closest('.task-btn');
+            if (!button) return;
+            const taskId = parseInt(button.dataset.taskId);
+            if (button.classList.contains('edit')) {
+                this.editTask(taskId);
+            } else if (button.classList.contains('delete')) {
+                this.confirmDelete(taskId, button.dataset.taskTitle);
+            }
+        });
+        
         // Filtros
         document.querySelectorAll('.filter-btn').forEach(btn => {
             btn.addEventListener('click', (e) => this.setFilter(e.target.dataset.filter));
@@ -77,9 +106,10 @@ class TaskTracker {
             this.updateWeather();
         }, 5 * 60 * 1000);
         
-        // Actualizar estadísticas cada 30 segundos
+        // Actualizar estadísticas y sincronizar cambios de otros clientes cada 30 segundos
         setInterval(() => {
             this.updateStats();
+            this.syncChanges();
         }, 30 * 1000);
     }
     
@@ -87,18 +117,85 @@ class TaskTracker {
     
     async loadTasks() {
         console.log('🔄 Cargando tareas...');
+        // Reiniciar la lista y cargar la primera página
+        this.tasks = [];
+        this.nextCursor = null;
+        this.clearRows();
+        await this.loadNextPage(true);
+    }
+    
+    async loadNextPage(firstPage = false) {
+        if (this.loadingPage || (!firstPage && !this.nextCursor)) return;
+        this.loadingPage = true;
         try {
-            const response = await fetch(`${this.API_BASE}/tasks`);
-            console.log('📡 Respuesta del servidor:', response.status);
+            const params = new URLSearchParams({ limit: this.PAGE_SIZE });
+            if (this.currentFilter !== 'todas') params.set('estado', this.currentFilter);
+            if (!firstPage) params.set('cursor', this.nextCursor);
+            
+            const response = await fetch(`${this.API_BASE}/tasks?${params}`);
             if (!response.ok) throw new Error(`Error ${response.status}`);
             
-            this.tasks = await response.json();
-            console.log('📋 Tareas cargadas:', this.tasks.length, this.tasks);
+            const page = await response.json();
+            this.tasks.push(...page);
+            this.nextCursor = response.headers.get('X-Next-Cursor');
+            // Solo la primera página fija el punto de sincronización: subirlo con páginas
+            // posteriores saltaría cambios de filas ya cargadas con un seq intermedio
+            if (firstPage) {
+                this.lastSeq = page.reduce((max, task) => Math.max(max, task.seq || 0), this.lastSeq);
+            }
+            console.log('📋 Tareas cargadas:', this.tasks.length);
             this.renderTasks();
-            console.log('✅ Tareas renderizadas correctamente');
             
         } catch (error) {
             console.error('❌ Error cargando tareas:', error);
+        } finally {
+            this.loadingPage = false;
+        }
+    }
+    
+    async syncChanges() {
+        // Sincronización delta: solo lo creado, actualizado o eliminado desde lastSeq
+        try {
+            let hasMore = true;
+            while (hasMore) {
+                const response = await fetch(`${this.API_BASE}/tasks/changes?since=${this.lastSeq}`);
+                if (!response.ok) throw new Error(`Error ${response.status}`);
+                
+                const delta = await response.json();
+                // Aplicar cambios y eliminaciones juntos en orden de seq (un ID puede reaparecer)
+                const entries = [
+                    ...delta.changes.map(task => ({ seq: task.seq, task })),
+                    ...delta.deleted.map(tombstone => ({ seq: tombstone.seq, deletedId: tombstone.id }))
+                ].sort((a, b) => a.seq - b.seq);
+                entries.forEach(entry => {
+                    if (entry.task) this.applyRemoteTask(entry.task);
+                    else this.removeTask(entry.deletedId);
+                });
+                
+                this.lastSeq = delta.next_since;
+                hasMore = delta.has_more;
+            }
+            this.renderTasks();
+            
+        } catch (error) {
+            console.error('Error sincronizando cambios:', error);
+        }
+    }
+    
+    applyRemoteTask(task) {
+        // Actualizar si ya está cargada; insertar solo si cae dentro del rango cargado
+        const index = this.tasks.findIndex(t => t.id === task.id);
+        if (index !== -1) {
+            this.patchTask(task);
+            return;
+        }
+        if (!this.matchesFilter(task)) return;
+        
+        const position = this.tasks.findIndex(t => this.compareTasks(task, t) < 0);
+        if (position !== -1) {
+            this.tasks.splice(position, 0, task);
+        } else if (!this.nextCursor) {
+            this.tasks.push(task);
         }
     }
     
@@ -136,27 +233,38 @@ class TaskTracker {
         if (!response.ok) throw new Error(`Error ${response.status}`);
         
         const newTask = await response.json();
-        this.tasks.unshift(newTask);
-        this.renderTasks();
+        if (this.matchesFilter(newTask)) {
+            this.tasks.unshift(newTask);
+            this.renderTasks();
+        }
         this.updateStats();
     }
     
     async updateTask(taskId, updates) {
+        const current = this.tasks.find(task => task.id === taskId);
+        const headers = { 'Content-Type': 'application/json' };
+        if (current && current.version) {
+            // Concurrencia optimista: falla con 412 si otro usuario la modificó
+            headers['If-Match'] = `"${current.version}"`;
+        }
+        
         const response = await fetch(`${this.API_BASE}/tasks/${taskId}`, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
+            method: 'PATCH',
+            headers,
             body: JSON.stringify(updates)
         });
         
+        if (response.status === 412) {
+            alert('La tarea fue modificada por otro usuario. Se recargará la lista.');
+            await this.loadTasks();
+            return;
+        }
         if (!response.ok) throw new Error(`Error ${response.status}`);
         
         const updatedTask = await response.json();
-        const index = this.tasks.findIndex(task => task.id === taskId);
-        if (index !== -1) {
-            this.tasks[index] = updatedTask;
-            this.renderTasks();
-            this.updateStats();
-        }
+        this.patchTask(updatedTask);
+        this.renderTasks();
+        this.updateStats();
     }
     
     async deleteTask(taskId) {
@@ -166,7 +274,7 @@ class TaskTracker {
         
         if (!response.ok) throw new Error(`Error ${response.status}`);
         
-        this.tasks = this.tasks.filter(task => task.id !== taskId);
+        this.removeTask(taskId);
         this.renderTasks();
         this.updateStats();
     }
@@ -185,45 +293,117 @@ class TaskTracker {
         const tasksList = document.getElementById('tasksList');
         const emptyState = document.getElementById('emptyState');
         
-        // Filtrar tareas
-        let filteredTasks = this.tasks;
-        if (this.currentFilter !== 'todas') {
-            filteredTasks = this.tasks.filter(task => task.estado === this.currentFilter);
-        }
-        
-        if (filteredTasks.length === 0) {
+        if (this.tasks.length === 0) {
             tasksList.style.display = 'none';
             emptyState.style.display = 'block';
+            this.clearRows();
             return;
         }
         
         tasksList.style.display = 'block';
         emptyState.style.display = 'none';
         
-        tasksList.innerHTML = filteredTasks.map(task => this.createTaskHTML(task)).join('');
+        // El espaciador tiene la altura de todas las filas cargadas
+        let spacer = tasksList.querySelector('.tasks-spacer');
+        if (!spacer) {
+            spacer = document.createElement('div');
+            spacer.className = 'tasks-spacer';
+            tasksList.replaceChildren(spacer);
+        }
+        spacer.style.height = `${this.tasks.length * this.ROW_HEIGHT}px`;
+        
+        // Rango visible (más un margen) según la posición del scroll
+        const first = Math.max(0, Math.floor(tasksList.scrollTop / this.ROW_HEIGHT) - this.OVERSCAN);
+        const last = Math.min(
+            this.tasks.length,
+            Math.ceil((tasksList.scrollTop + tasksList.clientHeight) / this.ROW_HEIGHT) + this.OVERSCAN
+        );
+        
+        // Reutilizar las filas ya renderizadas y crear solo las nuevas
+        const visibleIds = new Set();
+        for (let i = first; i < last; i++) {
+            const task = this.tasks[i];
+            visibleIds.add(task.id);
+            let element = this.rowElements.get(task.id);
+            if (!element) {
+                element = this.createTaskElement(task);
+                this.rowElements.set(task.id, element);
+                spacer.appendChild(element);
+            }
+            element.style.top = `${i * this.ROW_HEIGHT}px`;
+        }
         
-        // Agregar event listeners a los elementos de tarea
-        tasksList.querySelectorAll('.task-checkbox').forEach(checkbox => {
-            checkbox.addEventListener('change', (e) => {
-                const taskId = parseInt(e.target.dataset.taskId);
-                this.toggleTaskStatus(taskId);
-            });
+        this.rowElements.forEach((element, taskId) => {
+            if (!visibleIds.has(taskId)) {
+                element.remove();
+                this.rowElements.delete(taskId);
+            }
         });
         
-        tasksList.querySelectorAll('.task-btn.edit').forEach(btn => {
-            btn.addEventListener('click', (e) => {
-                const taskId = parseInt(e.target.dataset.taskId);
-                this.editTask(taskId);
-            });
+        // Pedir la siguiente página al acercarse al final
+        if (last >= this.tasks.length - this.OVERSCAN && this.nextCursor) {
+            this.loadNextPage();
+        }
+    }
+    
+    scheduleRender() {
+        // Un solo renderizado por frame durante el scroll
+        if (this.renderScheduled) return;
+        this.renderScheduled = true;
+        requestAnimationFrame(() => {
+            this.renderScheduled = false;
+            this.renderTasks();
         });
+    }
+    
+    clearRows() {
+        this.rowElements.forEach(element => element.remove());
+        this.rowElements.clear();
+    }
+    
+    createTaskElement(task) {
+        const template = document.createElement('template');
+        template.innerHTML = this.createTaskHTML(task).trim();
+        return template.content.firstElementChild;
+    }
+    
+    patchTask(task) {
+        // Actualizar una sola tarea: solo se reemplaza su fila si está visible
+        const index = this.tasks.findIndex(t => t.id === task.id);
+        if (index === -1) return;
         
-        tasksList.querySelectorAll('.task-btn.delete').forEach(btn => {
-            btn.addEventListener('click', (e) => {
-                const taskId = parseInt(e.target.dataset.taskId);
-                const taskTitle = e.target.dataset.taskTitle;
-                this.confirmDelete(taskId, taskTitle);
-            });
-        });
+        if (!this.matchesFilter(task)) {
+            this.removeTask(task.id);
+            return;
+        }
+        
+        this.tasks[index] = task;
+        const current = this.rowElements.get(task.id);
+        if (current) {
+            const element = this.createTaskElement(task);
+            element.style.top = current.style.top;
+            current.replaceWith(element);
+            this.rowElements.set(task.id, element);
+        }
+    }
+    
+    removeTask(taskId) {
+        this.tasks = this.tasks.filter(task => task.id !== taskId);
+        const element = this.rowElements.get(taskId);
+        if (element) {
+            element.remove();
+            this.rowElements.delete(taskId);
+        }
+    }
+    
+    matchesFilter(task) {
+        return this.currentFilter === 'todas' || task.estado === this.currentFilter;
+    }
+    
+    compareTasks(a, b) {
+        // Mismo orden que la API: más recientes primero, desempate por ID
+        const byDate = new Date(b.fecha_creacion) - new Date(a.fecha_creacion);
+        return byDate !== 0 ? byDate : b.id - a.id;
     }
     
     createTaskHTML(task) {
@@ -274,7 +454,9 @@ class TaskTracker {
             btn.classList.toggle('active', btn.dataset.filter === filter);
         });
         
-        this.renderTasks();
+        // El filtro se aplica en la API: recargar desde la primera página
+        document.getElementById('tasksList').scrollTop = 0;
+        this.loadTasks();
     }
     
     // === EDICIÓN DE TAREAS ===